@@ -0,0 +1,124 @@
+"""
+Memory used by the parsed floor plan models
+
+For each model in ``models/`` (or the files given as arguments) this script
+reports the bytes that stay allocated while the parsed model is kept in
+memory, measured with ``tracemalloc``, and the number of objects of the
+small model classes (lengths, angles, points, frames, ...) it holds. With
+``--eager-geometry`` the shapes, points and polyhedra of the floor plan
+elements are computed when the models are loaded instead of on their first
+access.
+
+Usage::
+
+    python benchmarks/model_memory.py [-n 3] [--eager-geometry] [models/hospital.fpm ...]
+"""
+
+import argparse
+import gc
+import glob
+import os
+import tracemalloc
+
+from collections import Counter
+
+from textx import language_for_file, metamodel_for_language
+
+MODELS_FOLDER = os.path.join(os.path.dirname(__file__), "..", "models")
+
+# Classes counted in the report
+COUNTED_CLASSES = [
+    "Length",
+    "Angle",
+    "Point",
+    "Frame",
+    "PositionCoordinate",
+    "PoseCoordinate",
+    "EulerAngles",
+    "Face",
+    "VariableReference",
+]
+
+
+def count_objects():
+    """Return the number of live objects of each counted class"""
+    return Counter(
+        type(obj).__name__
+        for obj in gc.get_objects()
+        if type(obj).__name__ in COUNTED_CLASSES
+    )
+
+
+def get_model_size(metamodel, path, repeat=1, **params):
+    """Return the bytes and the counted objects of a parsed model
+
+    The model is parsed ``repeat`` times, with the model parameters
+    ``params``, and all its copies are kept in memory, the results are the
+    averages per copy.
+    """
+    gc.collect()
+    counts = count_objects()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+
+    models = [metamodel.model_from_file(path, **params) for _ in range(repeat)]
+    gc.collect()
+
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    counts = count_objects() - counts
+    del models
+
+    return (current - start) / repeat, sum(counts.values()) // repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Report the memory used by each parsed floor plan model"
+    )
+    parser.add_argument(
+        "models", nargs="*", help="model files (default: all the models in models/)"
+    )
+    parser.add_argument(
+        "-n",
+        "--repeat",
+        type=int,
+        default=3,
+        help="number of copies of each model kept in memory at once",
+    )
+    parser.add_argument(
+        "--eager-geometry",
+        action="store_true",
+        help="compute the geometry of the floor plan elements when they are loaded",
+    )
+    args = parser.parse_args(argv)
+
+    paths = args.models
+    if not paths:
+        paths = sorted(
+            glob.glob(os.path.join(MODELS_FOLDER, "*.fpm"))
+            + glob.glob(os.path.join(MODELS_FOLDER, "*.variation"))
+        )
+
+    print("{:<36}  {:>12}  {:>8}".format("model", "bytes/model", "objects"))
+    total = 0
+    params = dict()
+    for path in paths:
+        language = language_for_file(path).name
+        metamodel = metamodel_for_language(language)
+        if "eager_geometry" in metamodel.model_param_defs:
+            params["eager_geometry"] = args.eager_geometry
+        else:
+            params.pop("eager_geometry", None)
+        # Parse once so that the imported models and caches are not counted
+        metamodel.model_from_file(path, **params)
+
+        size, objects = get_model_size(metamodel, path, args.repeat, **params)
+        total += size
+        print("{:<36}  {:>12,.0f}  {:>8}".format(os.path.basename(path), size, objects))
+
+    print("{:<36}  {:>12,.0f}".format("total", total))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Time spent resolving the references of the floor plan models
+
+For each model in ``models/`` (or the files given as arguments) this script
+reports the time to load the model and the part of it spent in the scope
+providers of the ``wrt:`` and ``of:`` references, with the name index of the
+model or, with ``--baseline``, with ``get_unique_named_object`` walking the
+whole model for every reference.
+
+Usage::
+
+    python benchmarks/reference_resolution.py [-n 5] [--baseline] [models/brsu_building_c_with_doors.fpm ...]
+"""
+
+import argparse
+import glob
+import os
+import time
+
+from textx import get_model, metamodel_for_language
+from textx.scoping.tools import get_unique_named_object
+
+import floorplan_dsl.scoping.fpm2 as scope2
+
+MODELS_FOLDER = os.path.join(os.path.dirname(__file__), "..", "models")
+
+
+def baseline_scope_provider(frame, attr, attr_ref):
+    """The scope provider of the spaces, looking up each name in the whole model"""
+    if attr_ref.obj_name == "this":
+        return scope2.space_location_scope_provider(frame, attr, attr_ref)
+    return get_unique_named_object(get_model(frame), attr_ref.obj_name)
+
+
+class TimedScopeProvider:
+    """Scope provider that measures the time spent in another one"""
+
+    def __init__(self, provider) -> None:
+        self.provider = provider
+        self.time = 0.0
+        self.calls = 0
+
+    def __call__(self, *args):
+        start = time.perf_counter()
+        try:
+            return self.provider(*args)
+        finally:
+            self.time += time.perf_counter() - start
+            self.calls += 1
+
+
+def time_model(metamodel, path, provider, repeat=1):
+    """Return the best load time of a model, with the time and calls of its scope provider"""
+    best = None
+    for _ in range(repeat):
+        provider.time, provider.calls = 0.0, 0
+        start = time.perf_counter()
+        metamodel.model_from_file(path)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[0]:
+            best = (elapsed, provider.time, provider.calls)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Report the time spent resolving the references of each floor plan model"
+    )
+    parser.add_argument(
+        "models",
+        nargs="*",
+        help="model files (default: all the .fpm models in models/)",
+    )
+    parser.add_argument(
+        "-n", "--repeat", type=int, default=5, help="number of loads of each model"
+    )
+    parser.add_argument(
+        "--baseline",
+        action="store_true",
+        help="look up each reference in the whole model instead of the name index",
+    )
+    args = parser.parse_args(argv)
+
+    paths = args.models or sorted(glob.glob(os.path.join(MODELS_FOLDER, "*.fpm")))
+
+    metamodel = metamodel_for_language("fpm")
+    provider = TimedScopeProvider(
+        baseline_scope_provider
+        if args.baseline
+        else scope2.space_location_scope_provider
+    )
+    for name in ("WallFrame.space", "SpaceFrame.space"):
+        metamodel.scope_providers[name] = provider
+
+    print(
+        "{:<36}  {:>10}  {:>10}  {:>6}".format("model", "load (s)", "scope (s)", "refs")
+    )
+    for path in paths:
+        elapsed, scope, calls = time_model(metamodel, path, provider, args.repeat)
+        print(
+            "{:<36}  {:>10.3f}  {:>10.3f}  {:>6}".format(
+                os.path.basename(path), elapsed, scope, calls
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
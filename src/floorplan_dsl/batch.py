@@ -0,0 +1,335 @@
+"""
+Batch generation of several models from a YAML manifest
+
+Example of a manifest::
+
+    output: gen/batch       # default output folder, one subfolder per language and model
+    workers: 4              # size of the process pool
+    cache: .cache/models    # optional cache of the loaded models
+    cache_size: 1024        # size of the cache in MiB
+    options:                # options given to every job
+      backend: native
+    jobs:
+      - model: models/*.fpm
+        target: json-ld
+      - model: models/hospital.variation
+        target: json-ld
+        output: gen/batch/hospital-variations
+        options:
+          variations: 10
+          seed: 42
+
+Paths are relative to the folder of the manifest and a ``model`` pattern
+expands into one job per matching file. Options are written as in the
+command line of ``textx generate`` without the leading ``--``; an option
+set to ``true`` is passed as a flag.
+
+With a ``cache`` folder, the workers load the models through a
+:class:`~floorplan_dsl.utils.cache.ModelCache` instead of the default one of
+:func:`~floorplan_dsl.utils.cache.get_model_cache`, so that the models whose
+files, imported models and model parameters did not change are not parsed
+again.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
+
+from textx import (
+    generator_for_language_target,
+    language_for_file,
+    metamodel_for_language,
+)
+
+from floorplan_dsl.utils.cache import (
+    DEFAULT_CACHE_SIZE,
+    ModelCache,
+    get_model_cache,
+    set_model_cache,
+)
+
+# Languages whose metamodels are built once by each worker
+BATCH_LANGUAGES = ["fpm", "fpm-variation"]
+
+
+class BatchJob:
+    """Generation of one model with one generator"""
+
+    def __init__(self, model, target, output_path, options=None) -> None:
+        self.model = model
+        self.target = target
+        self.output_path = output_path
+        self.options = options if options is not None else dict()
+
+    @property
+    def name(self):
+        return "{} -> {}".format(os.path.basename(self.model), self.target)
+
+
+class BatchResult:
+    """Timings, generated files and error of a job"""
+
+    def __init__(
+        self,
+        job,
+        parse_time=0.0,
+        generate_time=0.0,
+        files=None,
+        error=None,
+        cached=False,
+    ):
+        self.job = job
+        self.parse_time = parse_time
+        self.generate_time = generate_time
+        self.files = files if files is not None else list()
+        self.error = error
+        self.cached = cached
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+
+def cli_custom_args(options):
+    """Convert the options of a job into the custom arguments of a generator
+
+    The arguments are named as ``textx generate`` does: flags keep their
+    name, while the dashes of valued options are replaced by underscores.
+    """
+    custom_args = dict()
+    for name, value in options.items():
+        if value is True:
+            custom_args[name] = True
+        else:
+            custom_args[name.replace("-", "_")] = value
+    return custom_args
+
+
+def load_manifest(path):
+    """Read a manifest and expand it into the list of its jobs
+
+    Returns
+    -------
+    The jobs, the number of workers and the cache of the loaded models, or
+    None if the manifest does not set a cache folder
+    """
+    with open(path) as f:
+        manifest = yaml.safe_load(f)
+
+    base_path = os.path.dirname(os.path.abspath(path))
+    output = os.path.join(base_path, manifest.get("output", "gen"))
+    default_options = manifest.get("options") or dict()
+
+    jobs = list()
+    for entry in manifest.get("jobs", []):
+        if "model" not in entry or "target" not in entry:
+            raise ValueError(
+                "Each job of {} must have a model and a target".format(path)
+            )
+        options = dict(default_options)
+        options.update(entry.get("options") or dict())
+
+        pattern = os.path.join(base_path, entry["model"])
+        models = sorted(glob.glob(pattern))
+        if not models:
+            raise ValueError("No model matches {}".format(entry["model"]))
+
+        for model in models:
+            if "output" in entry:
+                output_path = os.path.join(base_path, entry["output"])
+            else:
+                model_name = os.path.splitext(os.path.basename(model))[0]
+                language = language_for_file(model).name
+                output_path = os.path.join(output, language, model_name)
+            jobs.append(BatchJob(model, entry["target"], output_path, options))
+
+    cache = None
+    if manifest.get("cache"):
+        cache_size = manifest.get("cache_size")
+        cache = ModelCache(
+            os.path.join(base_path, manifest["cache"]),
+            DEFAULT_CACHE_SIZE if cache_size is None else int(cache_size) << 20,
+        )
+
+    return jobs, manifest.get("workers", 1), cache
+
+
+def _init_batch_worker(cache=None, no_cache=False):
+    # metamodel_for_language caches the metamodels, so that fpv2_metamodel()
+    # and variation_metamodel() are built once and reused by all the jobs
+    for language in BATCH_LANGUAGES:
+        metamodel_for_language(language)
+    if no_cache:
+        set_model_cache(None)
+    elif cache is not None:
+        set_model_cache(cache)
+
+
+def run_job(job, overwrite=True, debug=False):
+    """Parse the model of a job and run its generator
+
+    Errors are not raised but recorded in the returned :class:`BatchResult`,
+    so that a failing job does not stop the rest of the batch. A job whose
+    model is found in the model cache is marked as ``cached``.
+    """
+    result = BatchResult(job)
+    try:
+        start = time.perf_counter()
+        language = language_for_file(job.model).name
+        metamodel = metamodel_for_language(language)
+        custom_args = cli_custom_args(job.options)
+        model_params = {
+            k: v for k, v in custom_args.items() if k in metamodel.model_param_defs
+        }
+        cache = get_model_cache()
+        hits = cache.stats.hits if cache is not None else 0
+        model = metamodel.model_from_file(job.model, **model_params)
+        result.parse_time = time.perf_counter() - start
+        result.cached = cache is not None and cache.stats.hits > hits
+
+        start = time.perf_counter()
+        generator = generator_for_language_target(language, job.target)
+        files = generator(
+            metamodel, model, job.output_path, overwrite, debug, **custom_args
+        )
+        result.generate_time = time.perf_counter() - start
+        if isinstance(files, list):
+            result.files = files
+        elif isinstance(files, tuple):
+            # The variation generators also return the path of the floor plan
+            result.files = files[-1]
+    except Exception:
+        result.error = traceback.format_exc()
+
+    return result
+
+
+def run_batch(jobs, workers=1, overwrite=True, debug=False, cache=None, no_cache=False):
+    """Run the jobs on a pool of ``workers`` processes and return their results in order
+
+    The models are loaded through the model ``cache`` if one is given, or
+    else through the default one of :func:`get_model_cache`, unless
+    ``no_cache`` is set.
+    """
+    if workers == 1 or len(jobs) == 1:
+        _init_batch_worker(cache, no_cache)
+        results = [run_job(job, overwrite, debug) for job in jobs]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(jobs)),
+            initializer=_init_batch_worker,
+            initargs=(cache, no_cache),
+        ) as executor:
+            futures = [executor.submit(run_job, job, overwrite, debug) for job in jobs]
+            results = [future.result() for future in futures]
+
+    return results
+
+
+def print_summary(results, elapsed, file=sys.stdout):
+    """Print the timings of each job, followed by the errors of the failed ones"""
+    width = max([len(r.job.name) for r in results] + [3])
+    print(
+        "{:<{w}}  {:>6}  {:>9}  {:>8}  {:>5}".format(
+            "job", "status", "parse (s)", "gen (s)", "files", w=width
+        ),
+        file=file,
+    )
+    for r in results:
+        print(
+            "{:<{w}}  {:>6}  {:>9.3f}  {:>8.3f}  {:>5}".format(
+                r.job.name,
+                "FAILED" if r.failed else "cached" if r.cached else "ok",
+                r.parse_time,
+                r.generate_time,
+                len(r.files),
+                w=width,
+            ),
+            file=file,
+        )
+
+    failed = [r for r in results if r.failed]
+    cached = sum(r.cached for r in results)
+    print(
+        "{} jobs, {} failed, {} cached, {:.3f} s".format(
+            len(results), len(failed), cached, elapsed
+        ),
+        file=file,
+    )
+    for r in failed:
+        print("\n{}:\n{}".format(r.job.name, r.error), file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate several floor plan models listed in a YAML manifest"
+    )
+    parser.add_argument("manifest", help="path of the YAML manifest")
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes (overrides the manifest)",
+    )
+    parser.add_argument(
+        "--no-overwrite",
+        action="store_true",
+        help="do not overwrite existing files",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="folder of the cache of the loaded models (overrides the manifest)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=None,
+        help="size of the cache in MiB, the least recently used models are evicted",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="parse all the models, without reading or writing the cache",
+    )
+    args = parser.parse_args(argv)
+
+    jobs, workers, cache = load_manifest(args.manifest)
+    if args.workers is not None:
+        workers = args.workers
+    if workers < 1:
+        parser.error("The number of workers must be a positive integer")
+
+    if args.cache_dir is not None:
+        cache = ModelCache(
+            args.cache_dir, DEFAULT_CACHE_SIZE if cache is None else cache.max_size
+        )
+    if args.cache_size is not None:
+        if args.cache_size < 0:
+            parser.error("The size of the cache must not be negative")
+        if cache is not None:
+            cache.max_size = args.cache_size << 20
+
+    start = time.perf_counter()
+    results = run_batch(
+        jobs,
+        workers,
+        overwrite=not args.no_overwrite,
+        cache=cache,
+        no_cache=args.no_cache,
+    )
+    print_summary(results, time.perf_counter() - start)
+
+    return 1 if any(r.failed for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
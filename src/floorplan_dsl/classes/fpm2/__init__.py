@@ -0,0 +1,85 @@
+# Slots where the objects of the slotted classes keep their position in the
+# model. textX stores the position of the grammar rule in the class attributes
+# _tx_position and _tx_position_end, which hide any slot with the same name
+TEXTX_SLOTS = ("_tx_model_position", "_tx_model_position_end")
+
+
+class PositionSlot:
+    """Position of an object in the model, stored in one of its slots
+
+    Objects that were not parsed from a model (e.g. default lengths created
+    by the classes) fall back to the position of the rule in the grammar,
+    as textX does for classes with a ``__dict__``.
+    """
+
+    def __init__(self, slot, default) -> None:
+        self.slot = slot
+        self.default = default
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self.default
+        try:
+            return self.slot.__get__(obj, cls)
+        except AttributeError:
+            return self.default
+
+    def __set__(self, obj, value):
+        self.slot.__set__(obj, value)
+
+
+def use_position_slots(classes):
+    """Make textX read and write the position of slotted objects in their slots
+
+    It must be called once the metamodel is created, as textX overwrites the
+    ``_tx_position`` and ``_tx_position_end`` attributes of the user classes
+    with the position of their rule in the grammar.
+    """
+    for cls in classes:
+        if TEXTX_SLOTS[0] not in cls.__dict__.get("__slots__", ()):
+            continue
+        for name, slot in zip(("_tx_position", "_tx_position_end"), TEXTX_SLOTS):
+            default = cls.__dict__.get(name)
+            if isinstance(default, PositionSlot):
+                default = default.default
+            setattr(cls, name, PositionSlot(cls.__dict__[slot], default))
+
+
+class DerivedAttribute:
+    """Attribute of an object computed on its first access
+
+    The value is kept in the ``__dict__`` of the object. Until it is set,
+    reading the attribute calls the method ``compute`` of the object, which
+    sets it (possibly together with other derived attributes). Deleting the
+    attribute makes it computed again on its next access.
+    """
+
+    def __init__(self, compute) -> None:
+        self.compute = compute
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        try:
+            return obj.__dict__[self.name]
+        except KeyError:
+            pass
+        getattr(obj, self.compute)()
+        return obj.__dict__.setdefault(self.name, None)
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.name] = value
+
+    def __delete__(self, obj):
+        obj.__dict__.pop(self.name, None)
+
+
+def is_pending(obj, name):
+    """Return whether a derived attribute of an object has not been computed yet"""
+    return (
+        isinstance(getattr(type(obj), name, None), DerivedAttribute)
+        and name not in obj.__dict__
+    )
@@ -46,10 +46,9 @@ class Space(SpaceSemantics):
             for i, (p1, p2) in enumerate(edges)
         ]
 
-        # TODO: Move to semantics processor?
-        self.compute_outer_wall_edges()
-        self.process_shape_semantics()
-        self.compute_3d_shape()
+        # The geometry of the space and its walls is computed by the geometry
+        # model processor, or on its first access
+        self.set_polytope_name()
 
 
 class Wall(WallSemantics):
@@ -75,6 +74,7 @@ class Wall(WallSemantics):
         # Semantics
         self.name = "{}-wall-{}".format(self.parent.name, self.idx)
         self.frame = Frame(self, self.name)
+        self.invalidate_cache()
 
 
 class Feature(FeatureSemantics):
@@ -95,8 +95,7 @@ class Column(Feature):
         if frame is None:
             self.frame = Frame(self, "column-{}".format(self.name))
 
-        self.process_shape_semantics()
-        self.compute_3d_shape()
+        self.set_polytope_name()
 
 
 class Divider(Feature):
@@ -113,8 +112,7 @@ class Divider(Feature):
         if frame is None:
             self.frame = Frame(self, "divider-{}".format(self.name))
 
-        self.process_shape_semantics()
-        self.compute_3d_shape()
+        self.set_polytope_name()
 
 
 class Opening(OpeningSemantics):
@@ -134,8 +132,7 @@ class Entryway(Opening):
         if frame is None:
             self.frame = Frame(self, "entryway-{}".format(self.name))
 
-        self.process_shape_semantics()
-        self.compute_3d_shape()
+        self.set_polytope_name()
 
 
 class Window(Opening):
@@ -151,5 +148,4 @@ class Window(Opening):
         if frame is None:
             self.frame = Frame(self, "window-{}".format(self.name))
 
-        self.process_shape_semantics()
-        self.compute_3d_shape()
+        self.set_polytope_name()
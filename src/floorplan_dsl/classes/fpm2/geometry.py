@@ -1,8 +1,10 @@
-import itertools
+from functools import lru_cache
 
-from textx import textx_isinstance, get_metamodel
+import numpy as np
 
+from floorplan_dsl.classes.fpm2 import TEXTX_SLOTS, DerivedAttribute
 from floorplan_dsl.classes.fpm2.qudt import Length, Angle
+from floorplan_dsl.utils.dispatch import get_types
 
 
 class PointCoordinate:
@@ -18,14 +20,16 @@ class PointCoordinate:
         elif isinstance(value, int) or isinstance(value, float):
             return Length(self, value)
 
-        mm = get_metamodel(value)
-        if textx_isinstance(value, mm["VariableReference"]):
+        types = get_types(value)
+        if types.isinstance(value, "VariableReference"):
             return value
-        elif textx_isinstance(value, mm["Length"]):
+        elif types.isinstance(value, "Length"):
             return value
 
 
 class EulerAngles:
+    __slots__ = ("parent", "x", "y", "z") + TEXTX_SLOTS
+
     def __init__(self, parent, x=None, y=None, z=None) -> None:
         self.parent = parent
         self.x = self._get_value(x)
@@ -38,20 +42,65 @@ class EulerAngles:
         elif isinstance(value, int) or isinstance(value, float):
             return Angle(self, value)
 
-        mm = get_metamodel(value)
-        if textx_isinstance(value, mm["VariableReference"]):
+        types = get_types(value)
+        if types.isinstance(value, "VariableReference"):
             return value
-        elif textx_isinstance(value, mm["Angle"]):
+        elif types.isinstance(value, "Angle"):
             return value
 
 
+class CoordinateLength:
+    """Length of a coordinate computed from the geometry of an element"""
+
+    __slots__ = ("parent", "value")
+
+    unit = "m"
+
+    def __init__(self, parent, value) -> None:
+        self.parent = parent
+        self.value = value
+
+
+class ShapeCoordinate:
+    """Point coordinate computed from the geometry of an element
+
+    It has the same ``x``, ``y`` and ``z`` lengths as a :class:`PointCoordinate`,
+    without the variables and instance dictionaries of the coordinates of
+    the model.
+    """
+
+    __slots__ = ("parent", "x", "y", "z")
+
+    def __init__(self, parent, x, y, z) -> None:
+        self.parent = parent
+        self.x = CoordinateLength(self, x)
+        self.y = CoordinateLength(self, y)
+        self.z = CoordinateLength(self, z)
+
+
+def get_shape_coordinates(parent, array):
+    """Return a :class:`ShapeCoordinate` for each row of a (n, 3) array"""
+    return [ShapeCoordinate(parent, x, y, z) for x, y, z in np.asarray(array).tolist()]
+
+
+def get_coordinate_array(coordinates):
+    """Return the (n, 3) array of the values of a list of point coordinates"""
+    return np.array(
+        [[c.x.value, c.y.value, c.z.value] for c in coordinates], dtype=float
+    ).reshape(-1, 3)
+
+
 class Point:
+    __slots__ = ("parent", "name") + TEXTX_SLOTS
+
     def __init__(self, parent, name) -> None:
         self.parent = parent
         self.name = name
 
 
 class Frame:
+    __slots__ = ("parent", "name", "origin") + TEXTX_SLOTS
+
     def __init__(self, parent, name, origin=None) -> None:
         self.parent = parent
         self.name = "{}-frame".format(name)
@@ -62,6 +111,8 @@ class Frame:
 
 
 class PositionCoordinate:
+    __slots__ = ("parent", "translation", "of", "wrt", "name") + TEXTX_SLOTS
+
     def __init__(self, parent, translation, of, wrt) -> None:
         self.parent = parent
         self.translation = translation
@@ -71,6 +122,15 @@ class PositionCoordinate:
 
 
 class PoseCoordinate:
+    __slots__ = (
+        "parent",
+        "of",
+        "wrt",
+        "translation",
+        "orientation",
+        "name",
+    ) + TEXTX_SLOTS
+
     def __init__(self, parent, of, wrt, translation=None, orientation=None) -> None:
         self.parent = parent
         self.of = of
@@ -85,7 +145,25 @@ class PoseCoordinate:
 
 
 class Polygon:
-    pass
+    # Points of the corners, computed with the geometry of the element
+    points = DerivedAttribute("compute_points")
+
+    def compute_points(self):
+        compute = getattr(self.parent, "compute_geometry", None)
+        if compute is not None:
+            compute()
+
+    @property
+    def coordinate_array(self):
+        """A new (n, 3) array of the values of the coordinates of the polygon"""
+        return get_coordinate_array(self.coordinates)
+
+    def set_coordinate_array(self, array):
+        """Write the values of a (n, 3) array into the coordinates of the polygon"""
+        for c, (x, y, z) in zip(self.coordinates, np.asarray(array).tolist()):
+            c.x.value = x
+            c.y.value = y
+            c.z.value = z
 
 
 class Rectangle(Polygon):
@@ -97,33 +175,43 @@ class Rectangle(Polygon):
 
         self.length = length
         self.height = height
-        self.coordinates = self.get_point_coordinates(
-            self.width, self.length, self.height
+        self.coordinates = get_shape_coordinates(
+            self, self.get_point_array(self.width, self.length, self.height)
         )
         self.points = points
 
-    def get_point_coordinates(self, width, length, height):
+    @staticmethod
+    def get_point_array(width, length, height):
         x = width.value / 2
 
-        coords = list()
         if length is not None:
             y = length.value / 2
-            coords = [
-                PointCoordinate(self, -x, y, 0.0),
-                PointCoordinate(self, x, y, 0.0),
-                PointCoordinate(self, x, -y, 0.0),
-                PointCoordinate(self, -x, -y, 0.0),
-            ]
+            return np.array(
+                [
+                    [-x, y, 0.0],
+                    [x, y, 0.0],
+                    [x, -y, 0.0],
+                    [-x, -y, 0.0],
+                ]
+            )
         elif height is not None:
             z = height.value / 2
-            coords = [
-                PointCoordinate(self, -x, 0.0, z),
-                PointCoordinate(self, x, 0.0, z),
-                PointCoordinate(self, x, 0.0, -z),
-                PointCoordinate(self, -x, 0.0, -z),
-            ]
+            return np.array(
+                [
+                    [-x, 0.0, z],
+                    [x, 0.0, z],
+                    [x, 0.0, -z],
+                    [-x, 0.0, -z],
+                ]
+            )
 
-        return coords
+        return np.empty((0, 3))
+
+    def update_point_coordinates(self):
+        """Recompute the values of the coordinates in place, e.g. after sampling a new width"""
+        self.set_coordinate_array(
+            self.get_point_array(self.width, self.length, self.height)
+        )
 
 
 class Circle(Polygon):
@@ -134,11 +222,14 @@ class Circle(Polygon):
 
 
 class SimplePolygon(Polygon):
-    def __init__(self, parent, coordinates, points=None) -> None:
+    def __init__(self, parent, coordinates, points=None, coordinate_array=None) -> None:
         self.parent = parent
         self.coordinates = coordinates
         self.points = points
 
+        if coordinate_array is not None:
+            self.coordinates = get_shape_coordinates(self, coordinate_array)
+
 
 class Polyhedron:
 
@@ -164,18 +255,15 @@ class Polyhedron:
         self.name = "{}-polyhedron".format(self.parent.name)
 
         # Semantics
-        self.coordinates = list()
-        self.coordinates.extend(self.base.coordinates)
-        for p in self.base.coordinates:
-            if self.height:
-                coord = PointCoordinate(self, p.x.value, p.y.value, self.height.value)
-            else:
-                # For windows and entryways use thickness
-                coord = PointCoordinate(
-                    self, p.x.value, self.thickness.value, p.z.value
-                )
-
-            self.coordinates.append(coord)
+        # The bottom coordinates are the ones of the base
+        top = self.base.coordinate_array
+        if self.height:
+            top[:, 2] = self.height.value
+        else:
+            # For windows and entryways use thickness
+            top[:, 1] = self.thickness.value
+        self.coordinates = list(self.base.coordinates)
+        self.coordinates.extend(get_shape_coordinates(self, top))
 
         # TODO Move to semantics. Temporarily here to avoid circular imports
         self.points = list()
@@ -189,33 +277,33 @@ class Polyhedron:
             points = [self.points[idx] for idx in face]
             self.faces.append(Face(self, face, points=points))
 
+    @property
+    def coordinate_array(self):
+        """The (2n, 3) array of the bottom and top coordinates of the polyhedron"""
+        return get_coordinate_array(self.coordinates)
+
     def _get_face_index(self):
-        face_idx = list()
-        face_idx.append([self.coordinates.index(p) for p in self.base.coordinates])
-
-        top = self.coordinates[len(self.base.coordinates) :]
-        face_idx.append([self.coordinates.index(p) for p in top])
-        top.append(top[0])
-        top = list(itertools.pairwise(top))
-        bottom = self.base.coordinates
-        bottom.append(bottom[0])
-        for idx, b in enumerate(itertools.pairwise(bottom)):
-            t = top[idx]
-            p1, p2 = b
-            p3, p4 = t
-            face_idx.append(
-                [
-                    self.coordinates.index(p1),
-                    self.coordinates.index(p2),
-                    self.coordinates.index(p4),
-                    self.coordinates.index(p3),
-                ]
-            )
+        return [list(face) for face in get_prism_face_index(len(self.base.coordinates))]
+
 
-        return face_idx
+@lru_cache(maxsize=None)
+def get_prism_face_index(n):
+    """Return the faces of a prism extruded from a base polygon with ``n`` vertices
+
+    The coordinates of the prism are the ``n`` base vertices followed by the
+    ``n`` top vertices, so the faces are given by the indices of the bottom
+    face, the top face and the side face of each edge of the base.
+    """
+    faces = [tuple(range(n)), tuple(range(n, 2 * n))]
+    for i in range(n):
+        j = (i + 1) % n
+        faces.append((i, j, n + j, n + i))
+    return tuple(faces)
 
 
 class Face:
+    __slots__ = ("parent", "coord_idx", "coordinates", "points") + TEXTX_SLOTS
+
     def __init__(self, parent, coord_idx, coordinates=None, points=None):
         self.parent = parent
         self.coord_idx = coord_idx
@@ -1,7 +1,12 @@
 import numpy as np
 
+from floorplan_dsl.classes.fpm2 import TEXTX_SLOTS
+
 
 class Angle:
+    # declared_unit is set when the value is converted to another unit
+    __slots__ = ("parent", "value", "unit", "declared_unit") + TEXTX_SLOTS
+
     def __init__(self, parent, value=0.0, unit="rad") -> None:
         self.parent = parent
         self.value = value
@@ -16,6 +21,8 @@ class Angle:
 
 
 class Length:
+    __slots__ = ("parent", "value", "unit") + TEXTX_SLOTS
+
     def __init__(self, parent, value=0.0, unit="m") -> None:
         self.parent = parent
         self.value = value
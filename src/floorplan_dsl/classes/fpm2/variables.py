@@ -1,7 +1,11 @@
 import numpy as np
 
+from floorplan_dsl.classes.fpm2 import TEXTX_SLOTS
+
 
 class VariableReference:
+    __slots__ = ("parent", "var_neg", "variable", "_sign") + TEXTX_SLOTS
+
     def __init__(self, parent, var_neg, variable) -> None:
         self.parent = parent
         self.var_neg = var_neg
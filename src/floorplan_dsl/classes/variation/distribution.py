@@ -8,8 +8,13 @@ class Distribution(object):
         self.func = None
         self.dist = None
 
-    def sample(self):
-        return np.around(self.func(**self.dist), 2)
+    def sample(self, rng=np.random):
+        """Draw one value using the random stream ``rng`` (defaults to the global numpy stream)"""
+        return np.around(getattr(rng, self.func)(**self.dist), 2)
+
+    def sample_n(self, n, rng=np.random):
+        """Draw ``n`` values in a single vectorized call and return them as an array"""
+        return np.around(getattr(rng, self.func)(size=n, **self.dist), 2)
 
 
 class UniformDistribution(Distribution):
@@ -18,10 +23,14 @@ class UniformDistribution(Distribution):
         super().__init__(parent)
         self.values = values
 
-    def sample(self):
-        index = np.random.randint(low=0, high=len(self.values))
+    def sample(self, rng=np.random):
+        index = rng.randint(low=0, high=len(self.values))
         return self.values[index]
 
+    def sample_n(self, n, rng=np.random):
+        index = rng.randint(low=0, high=len(self.values), size=n)
+        return np.asarray(self.values, dtype=float)[index]
+
 
 class DiscreteDistribution(Distribution):
 
@@ -30,8 +39,15 @@ class DiscreteDistribution(Distribution):
         self.probabilitities = [pair.prob for pair in pairs]
         self.values = [pair.value for pair in pairs]
 
-    def sample(self):
-        return np.random.choice(self.values, 1, p=self.probabilitities)[0]
+    def sample(self, rng=np.random):
+        return rng.choice(self.values, 1, p=self.probabilitities)[0]
+
+    def sample_n(self, n, rng=np.random):
+        return rng.choice(
+            np.asarray(self.values, dtype=float),
+            n,
+            p=np.asarray(self.probabilitities, dtype=float),
+        )
 
 
 class NormalDistribution(Distribution):
@@ -41,5 +57,5 @@ class NormalDistribution(Distribution):
         self.mean = mean
         self.std = std
 
-        self.func = np.random.normal
+        self.func = "normal"
         self.dist = {"loc": self.mean, "scale": self.std}
@@ -0,0 +1,162 @@
+"""
+Euclidean signed distance fields of floor plans
+
+The obstacles of a floor plan are its walls, without the passages of the
+entryways, and its features. The field is the distance of the center of
+each cell to the boundary of the obstacles, negative inside them. It is
+computed from the edges of the obstacle polygons, so it is exact up to the
+approximation of circles by polygons, instead of being derived from a
+rasterized occupancy grid.
+
+The grid is evaluated in square chunks of cells with vectorized distances
+to the edges. For each chunk, only the edges that may be the closest one to
+any of its cells are considered: those within the distance of the center of
+the chunk to its closest edge plus the diagonal of the chunk. The field is
+written chunk by chunk to a memory-mapped ``.npy`` file.
+"""
+
+import os
+
+import numpy as np
+
+from shapely import Polygon, contains_xy, get_parts, union_all
+from textx import TextXSemanticError
+
+from floorplan_dsl.generators.occupancy import get_footprints, get_grid
+from floorplan_dsl.utils.raster import (
+    get_min_segment_distances,
+    get_segment_distances,
+)
+
+# Extension of the passages of the entryways beyond their walls, so that no
+# sliver of wall is left in the passages by rounding errors
+PASSAGE_MARGIN = 1e-3
+
+DTYPES = ["float16", "float32"]
+
+
+def get_obstacles(model, resolution):
+    """Return the obstacles of a floor plan as a shapely geometry, and the footprints used for its grid"""
+    spaces, walls, passages, features = get_footprints(
+        model, resolution, PASSAGE_MARGIN
+    )
+    obstacles = union_all([Polygon(p).buffer(0) for p in walls])
+    if passages:
+        obstacles = obstacles.difference(
+            union_all([Polygon(p).buffer(0) for p in passages])
+        )
+    if features:
+        obstacles = obstacles.union(union_all([Polygon(p).buffer(0) for p in features]))
+    return obstacles, spaces + walls + features
+
+
+def get_segments(geometry):
+    """Return the (m, 4) array of the edges of the rings of the polygons of a geometry"""
+    segments = list()
+    for polygon in get_parts(geometry):
+        if polygon.geom_type != "Polygon" or polygon.is_empty:
+            continue
+        for ring in [polygon.exterior, *polygon.interiors]:
+            points = np.asarray(ring.coords)[:, :2]
+            segments.append(np.hstack((points[:-1], points[1:])))
+    if not segments:
+        return np.empty((0, 4))
+    return np.concatenate(segments)
+
+
+def write_esdf(
+    obstacles, path, origin, shape, resolution, chunk_size=32, dtype="float32"
+):
+    """Evaluate the signed distance field of obstacles on a grid and save it as .npy
+
+    Parameters
+    ----------
+    obstacles: shapely geometry of the obstacles
+    path: the .npy file
+    origin: (x, y) coordinates of the lower left corner of the grid
+    shape: (rows, cols) of the grid, row 0 being the lowest one
+    resolution: size of the cells in meters
+    chunk_size: number of rows and columns of the chunks
+    dtype: float16 or float32
+    """
+    segments = get_segments(obstacles)
+    if len(segments) == 0:
+        raise TextXSemanticError("The floor plan has no obstacle")
+
+    rows, cols = shape
+    field = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+    # Largest distance from the center of a chunk to one of its cells
+    radius = np.sqrt(2) * chunk_size * resolution / 2
+
+    for r0 in range(0, rows, chunk_size):
+        r1 = min(r0 + chunk_size, rows)
+        c0s = np.arange(0, cols, chunk_size)
+        c1s = np.minimum(c0s + chunk_size, cols)
+
+        # Distances of the centers of the chunks of this row to all the edges
+        centers = (
+            origin
+            + np.column_stack(((c0s + c1s) / 2, np.full(len(c0s), (r0 + r1) / 2)))
+            * resolution
+        )
+        to_centers = get_segment_distances(centers, segments)
+        bounds = to_centers.min(axis=1) + 2 * radius
+
+        for k, (c0, c1) in enumerate(zip(c0s, c1s)):
+            near = segments[to_centers[k] <= bounds[k]]
+            x = origin[0] + (np.arange(c0, c1) + 0.5) * resolution
+            y = origin[1] + (np.arange(r0, r1) + 0.5) * resolution
+            xx, yy = np.meshgrid(x, y)
+
+            distances = get_min_segment_distances(
+                np.column_stack((xx.ravel(), yy.ravel())), near
+            ).reshape(xx.shape)
+            distances[contains_xy(obstacles, xx, yy)] *= -1
+            field[r0:r1, c0:c1] = distances
+
+    field.flush()
+    del field
+
+
+def write_esdf_descriptor(path, field, resolution, origin, shape, dtype):
+    """Write the YAML descriptor of a signed distance field"""
+    with open(path, "w") as f:
+        f.write("field: {}\n".format(field))
+        f.write("resolution: {}\n".format(resolution))
+        f.write("origin: [{}, {}, 0.0]\n".format(origin[0], origin[1]))
+        f.write("rows: {}\n".format(shape[0]))
+        f.write("cols: {}\n".format(shape[1]))
+        f.write("dtype: {}\n".format(dtype))
+
+
+def esdf_generator(
+    metamodel, model, output_path, overwrite=True, debug=False, **custom_args
+):
+    os.makedirs(output_path, exist_ok=True)
+
+    if "{{model_name}}" in output_path:
+        output_path = output_path.replace("{{model_name}}", model.name)
+        os.makedirs(output_path, exist_ok=True)
+
+    resolution = float(custom_args.get("resolution", 0.05))
+    margin = float(custom_args.get("margin", 0.5))
+    chunk_size = int(custom_args.get("chunk_size", 32))
+    if resolution <= 0 or chunk_size <= 0:
+        raise TextXSemanticError("The resolution and chunk size must be positive")
+
+    dtype = custom_args.get("dtype", "float32")
+    if dtype not in DTYPES:
+        raise TextXSemanticError(
+            "Unknown ESDF dtype {}, expected one of {}".format(dtype, ", ".join(DTYPES))
+        )
+
+    field = "{}.npy".format(model.name)
+    npy_file = os.path.join(output_path, field)
+    yaml_file = os.path.join(output_path, "{}.yaml".format(model.name))
+
+    obstacles, footprints = get_obstacles(model, resolution)
+    origin, rows, cols = get_grid(footprints, resolution, margin)
+    write_esdf(obstacles, npy_file, origin, (rows, cols), resolution, chunk_size, dtype)
+    write_esdf_descriptor(yaml_file, field, resolution, origin, (rows, cols), dtype)
+
+    return [npy_file, yaml_file]
@@ -1,107 +1,147 @@
 import os
+from functools import lru_cache
 
 import numpy as np
 
-from textx import get_children_of_type
-from textxjinja import textx_jinja_generator
-
-from floorplan_dsl.utils.qudt import convert_angle_units
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from textx import TextXSemanticError
+
+from floorplan_dsl.generators.jsonld import JSONLD_DOCUMENTS
+from floorplan_dsl.processors.validation.geometry import validate_floorplan_geometry
+from floorplan_dsl.utils.index import get_model_index
+from floorplan_dsl.utils.qudt import convert_model_angle_units
+from floorplan_dsl.utils.transformations import Transformation
+
+JSONLD_TEMPLATE_FOLDER = os.path.join(os.path.dirname(__file__), "../templates/json-ld")
+
+# Documents generated for each floor plan, one template each
+JSONLD_TEMPLATES = [
+    "skeleton.json.jinja",
+    "shape.json.jinja",
+    "spatial_relations.json.jinja",
+    "floorplan.json.jinja",
+    "coordinate.json.jinja",
+    "polyhedron.json.jinja",
+]
+
+
+@lru_cache(maxsize=None)
+def get_jsonld_environment(bytecode_cache=None):
+    """Return the Jinja environment of the json-ld templates
+
+    The environment is created once per process and keeps the compiled
+    templates (including the shared ``floorplan/`` and ``geometry/``
+    includes) for all the documents and models generated afterwards.
+
+    Parameters
+    ----------
+    bytecode_cache: optional directory where the compiled templates are
+        persisted, so that new processes can skip their compilation
+    """
+    bcc = None
+    if bytecode_cache is not None:
+        os.makedirs(bytecode_cache, exist_ok=True)
+        bcc = FileSystemBytecodeCache(bytecode_cache)
+
+    return Environment(
+        loader=FileSystemLoader(searchpath=JSONLD_TEMPLATE_FOLDER),
+        trim_blocks=True,
+        lstrip_blocks=True,
+        bytecode_cache=bcc,
+    )
 
 
 def jsonld_floorplan_generator(
     metamodel, model, output_path, overwrite=True, debug=False, **custom_args
 ):
-    if not os.path.exists(output_path):
-        os.makedirs(output_path)
-
     if "{{model_name}}" in output_path:
         output_path = output_path.replace("{{model_name}}", model.name)
-        if not os.path.exists(output_path):
-            os.makedirs(output_path)
 
-    if not os.path.exists(output_path):
-        os.makedirs(output_path)
+    os.makedirs(output_path, exist_ok=True)
+
+    # The geometry is checked before the angles are converted to the output unit
+    if custom_args.get("check-geometry", False):
+        validate_floorplan_geometry(model)
 
     angle_unit = custom_args.get("angle-unit", "rad")
-    for a in get_children_of_type("Angle", model):
-        convert_angle_units(a, angle_unit)
-    for a in get_children_of_type("AngleVariable", model):
-        convert_angle_units(a, angle_unit)
+    convert_model_angle_units(model, angle_unit)
 
     # Change the frame of reference of wall's shape points to compare against v1 models
     # TODO Remove this once v1 is deprecated
     wall_point_reference = custom_args.get("change-wall-point-reference", False)
     if wall_point_reference:
-        for s in get_children_of_type("Space", model):
-            for w in s.walls:
-                tm = w.get_transformation_matrix_wrt_parent()
-                for p in w.shape.coordinates:
-                    point = np.array([p.x.value, p.y.value, p.z.value, 1])
-                    point_wrt_space = np.einsum("ij,j->i", tm, point)
-                    p.x.value = round(point_wrt_space[0], 2)
-                    p.y.value = round(point_wrt_space[1], 2)
+        for s in get_model_index(model).get_children_of_type("Space"):
+            tms = s.get_wall_transformation_matrices()
+            coords = np.array([w.shape.coordinate_array for w in s.walls])
+            points_wrt_space = Transformation.transform_points(tms, coords)
+            for w, c, points in zip(s.walls, coords, points_wrt_space):
+                c[:, :2] = np.around(points[:, :2], 2)
+                w.shape.set_coordinate_array(c)
+
+    backend = custom_args.get("backend", "jinja")
+    if backend not in ["jinja", "native"]:
+        raise TextXSemanticError(
+            "Unknown json-ld backend {}, expected jinja or native".format(backend)
+        )
+
+    if backend == "native":
+        gen_files = write_jsonld_documents(model, output_path, angle_unit)
+    else:
+        gen_files = render_jsonld_templates(
+            model, output_path, angle_unit, custom_args.get("template_cache")
+        )
+
+    if custom_args.get("check-templates", False):
+        check_jsonld_documents(
+            model, gen_files, angle_unit, custom_args.get("template_cache")
+        )
+
+    return gen_files
 
+
+def render_jsonld_templates(model, output_path, angle_unit, template_cache=None):
+    """Render the json-ld documents of a model with the Jinja templates"""
     # Prepare context dictionary
-    context = dict(trim_blocks=True, lstrip_blocks=True)
+    context = dict()
     context["model"] = model
     context["angle_unit"] = angle_unit
 
-    this_folder = os.path.dirname(__file__)
+    env = get_jsonld_environment(template_cache)
     gen_files = []
-    # If given a directory instead of a single template, textX-Jinja copies the entire file/folder tree to the output folder
-    # For now we invoke the generator for each template we are interested in
-    # TODO Find more optimal way to handle templates
-    template_folder = os.path.join(
-        this_folder, "../templates/json-ld/skeleton.json.jinja"
-    )
-    # Run Jinja generator
-    textx_jinja_generator(template_folder, output_path, context, overwrite=True)
-    f = os.path.join(
-        output_path, os.path.split(template_folder)[-1].replace(".jinja", "")
-    )
-    gen_files.append(f)
+    for template in JSONLD_TEMPLATES:
+        f = os.path.join(output_path, template.replace(".jinja", ""))
+        with open(f, "w") as output:
+            output.write(env.get_template(template).render(**context))
+        gen_files.append(f)
 
-    template_folder = os.path.join(this_folder, "../templates/json-ld/shape.json.jinja")
-    textx_jinja_generator(template_folder, output_path, context, overwrite=True)
-    f = os.path.join(
-        output_path, os.path.split(template_folder)[-1].replace(".jinja", "")
-    )
-    gen_files.append(f)
+    return gen_files
 
-    template_folder = os.path.join(
-        this_folder, "../templates/json-ld/spatial_relations.json.jinja"
-    )
-    textx_jinja_generator(template_folder, output_path, context, overwrite=True)
-    f = os.path.join(
-        output_path, os.path.split(template_folder)[-1].replace(".jinja", "")
-    )
-    gen_files.append(f)
 
-    template_folder = os.path.join(
-        this_folder, "../templates/json-ld/floorplan.json.jinja"
-    )
-    textx_jinja_generator(template_folder, output_path, context, overwrite=True)
-    f = os.path.join(
-        output_path, os.path.split(template_folder)[-1].replace(".jinja", "")
-    )
-    gen_files.append(f)
+def write_jsonld_documents(model, output_path, angle_unit):
+    """Stream the json-ld documents of a model to their files with the native serializer"""
+    gen_files = []
+    for document in JSONLD_DOCUMENTS:
+        f = os.path.join(output_path, document.name)
+        with open(f, "w") as output:
+            document(angle_unit).write(output, model)
+        gen_files.append(f)
 
-    template_folder = os.path.join(
-        this_folder, "../templates/json-ld/coordinate.json.jinja"
-    )
-    textx_jinja_generator(template_folder, output_path, context, overwrite=True)
-    f = os.path.join(
-        output_path, os.path.split(template_folder)[-1].replace(".jinja", "")
-    )
-    gen_files.append(f)
+    return gen_files
 
-    template_folder = os.path.join(
-        this_folder, "../templates/json-ld/polyhedron.json.jinja"
-    )
-    textx_jinja_generator(template_folder, output_path, context, overwrite=True)
-    f = os.path.join(
-        output_path, os.path.split(template_folder)[-1].replace(".jinja", "")
-    )
-    gen_files.append(f)
 
-    return gen_files
+def check_jsonld_documents(model, files, angle_unit, template_cache=None):
+    """Check that the generated json-ld files match the output of the templates byte for byte"""
+    env = get_jsonld_environment(template_cache)
+    mismatches = []
+    for template, f in zip(JSONLD_TEMPLATES, files):
+        expected = env.get_template(template).render(model=model, angle_unit=angle_unit)
+        with open(f) as generated:
+            if generated.read() != expected:
+                mismatches.append(os.path.basename(f))
+
+    if mismatches:
+        raise TextXSemanticError(
+            "The json-ld documents {} of {} do not match the templates".format(
+                ", ".join(mismatches), model.name
+            )
+        )
@@ -0,0 +1,532 @@
+"""
+Native serializer of the json-ld documents of a floor plan
+
+Each document mirrors one of the ``templates/json-ld/*.json.jinja`` templates
+and produces byte-identical output. Instead of building the whole document
+as a string, the JSON objects are written to the output file as the model is
+traversed, so the memory used does not grow with the size of the floor plan.
+"""
+
+BASE_URL = "https://secorolab.github.io/models/floorplan/"
+
+
+def write_point(out, point_id):
+    out.write('        {\n            "@id": "')
+    out.write(point_id)
+    out.write('",\n            "@type": [ "3D", "Euclidean", "Point" ]\n        }')
+
+
+def write_frame(out, frame_id, origin_id):
+    out.write('        {\n            "@id": "')
+    out.write(frame_id)
+    out.write('",\n            "@type": "Frame",\n            "origin": "')
+    out.write(origin_id)
+    out.write('"\n        }')
+
+
+def write_id_list(out, ids, indent):
+    """Write the items of a list of ids, separated by commas"""
+    for i, _id in enumerate(ids):
+        if i > 0:
+            out.write(",\n")
+        out.write(indent)
+        out.write('"')
+        out.write(str(_id))
+        out.write('"')
+
+
+def write_polygon(out, shape):
+    out.write('        {\n            "@id": "')
+    out.write(str(shape.name))
+    out.write('",\n            "@type": "Polygon",\n            "points": [\n')
+    write_id_list(out, [p.name for p in shape.points], "            ")
+    out.write("\n            ]\n        }")
+
+
+def write_polyhedron(out, shape):
+    out.write('        {\n          "@id": "')
+    out.write(str(shape.name))
+    out.write('",\n          "@type": "Polyhedron",\n          "points": [\n')
+    write_id_list(out, [p.name for p in shape.points], "            ")
+    out.write('\n          ],\n          "faces": [\n')
+    faces = list(shape.faces)
+    for i, face in enumerate(faces):
+        out.write("            [\n")
+        write_id_list(out, [p.name for p in face.points], "            ")
+        out.write("\n            ]")
+        if i < len(faces) - 1:
+            out.write(",\n")
+    out.write("\n          ]\n        }")
+
+
+def write_spatial_relation(out, rel_id, rel_type, of, wrt, qty):
+    out.write('        {\n            "@id": "')
+    out.write(str(rel_id))
+    out.write('",\n            "@type": "')
+    out.write(rel_type)
+    out.write('",\n            "of": "')
+    out.write(str(of))
+    out.write('",\n            "with-respect-to": "')
+    out.write(str(wrt))
+    out.write('",\n            "quantity-kind": ')
+    out.write(qty)
+    out.write("        }")
+
+
+def write_pose_relation(out, pose):
+    write_spatial_relation(
+        out, pose.name, "Pose", pose.of.name, pose.wrt.name, '["Angle", "Length"]'
+    )
+
+
+def write_position_relation(out, position):
+    write_spatial_relation(
+        out,
+        position.name,
+        "Position",
+        position.of.name,
+        position.wrt.origin.name,
+        '"Length"',
+    )
+
+
+def write_pose_coordinate(out, pose, angle_unit):
+    out.write('        {\n            "@id": "coord-')
+    out.write(str(pose.name))
+    out.write(
+        '",\n            "@type": [\n'
+        '                "PoseReference", \n'
+        '                "PoseCoordinate", \n'
+        '                "VectorXYZ",\n'
+        '                "EulerAngles"\n'
+        "            ],\n"
+        '            "of-pose": "'
+    )
+    out.write(str(pose.name))
+    out.write('",\n            "as-seen-by": "')
+    out.write(str(pose.wrt.name))
+    out.write('",\n            "unit": [\n                "M",\n                "')
+    out.write(str(angle_unit).upper())
+    out.write('"\n            ],\n')
+
+    orientation = getattr(pose, "orientation", None)
+    if orientation:
+        if orientation.z:
+            out.write('            "alpha": ')
+            out.write(str(orientation.z.value))
+            out.write(",")
+        out.write("\n")
+        if orientation.y:
+            out.write('            "beta": ')
+            out.write(str(orientation.y.value))
+            out.write(",")
+        out.write("\n")
+
+    translation = getattr(pose, "translation", None)
+    if translation:
+        if translation.x:
+            out.write('            "x": ')
+            out.write(str(translation.x.value))
+        if translation.y and translation.x:
+            out.write(",")
+        out.write("\n")
+        if translation.y:
+            out.write('            "y": ')
+            out.write(str(translation.y.value))
+        if translation.z:
+            out.write(",")
+            out.write('\n            "z": ')
+            out.write(str(translation.z.value))
+        out.write("\n")
+    out.write("        }")
+
+
+def write_position_coordinate(out, position):
+    out.write('        {\n            "@id": "coord-')
+    out.write(str(position.name))
+    out.write(
+        '",\n            "@type": [\n'
+        '                "PositionReference", \n'
+        '                "PositionCoordinate", \n'
+        '                "VectorXYZ"\n'
+        "            ],\n"
+        '            "of-position": "'
+    )
+    out.write(str(position.name))
+    out.write('",\n            "as-seen-by": "')
+    out.write(str(position.wrt.name))
+    out.write('",\n            "unit": "M",\n')
+
+    translation = position.translation
+    if translation.x:
+        out.write('            "x": ')
+        out.write(str(translation.x.value))
+        out.write(",")
+    out.write("\n")
+    if translation.y:
+        out.write('            "y": ')
+        out.write(str(translation.y.value))
+        out.write(",")
+    out.write("\n")
+    if translation.z:
+        out.write('            "z": ')
+        out.write(str(translation.z.value))
+    out.write("\n        }")
+
+
+def write_separated(out, items, write):
+    """Write each item with ``write``, separated by commas"""
+    items = list(items)
+    for i, item in enumerate(items):
+        write(out, item)
+        if i < len(items) - 1:
+            out.write(",\n")
+
+
+class JsonLdDocument:
+    """Base document, equivalent to ``floorplan/floorplan.json``
+
+    The graph is a traversal of the spaces (with their walls and features)
+    followed by the wall openings. Subclasses write the JSON objects of each
+    element by overriding :meth:`space`, :meth:`wall`, :meth:`feature` and
+    :meth:`opening`. The ``last`` argument tells whether the element is the
+    last one of its list, as ``loop.last`` in the templates.
+    """
+
+    name = None
+    metamodels = []
+
+    def __init__(self, angle_unit="rad") -> None:
+        self.angle_unit = angle_unit
+
+    def write(self, out, model):
+        out.write('{\n    "@context": [\n')
+        self.context(out, model)
+        out.write('    ],\n    "@graph": [\n')
+        self.graph(out, model)
+        out.write("\n    ]\n}")
+
+    def context(self, out, model):
+        out.write('        {\n          "@base": "')
+        out.write(BASE_URL + str(model.name))
+        out.write('/",\n          "fpm": "')
+        out.write(BASE_URL + str(model.name))
+        out.write('/"\n        },\n')
+        for i, url in enumerate(self.metamodels):
+            out.write('        "')
+            out.write(url)
+            out.write('",\n' if i < len(self.metamodels) - 1 else '"\n')
+
+    def graph(self, out, model):
+        spaces = list(model.spaces)
+        for i, space in enumerate(spaces):
+            self.space(out, space, i == len(spaces) - 1)
+            walls = list(space.walls)
+            for j, w in enumerate(walls):
+                self.wall(out, w, j == len(walls) - 1)
+            features = list(space.features)
+            if features:
+                out.write(",\n")
+            for j, f in enumerate(features):
+                self.feature(out, f, j == len(features) - 1)
+            if i < len(spaces) - 1:
+                out.write(",\n")
+
+        openings = list(model.wall_openings)
+        if openings:
+            out.write(",")
+        for i, o in enumerate(openings):
+            self.opening(out, o, i == len(openings) - 1)
+            if i < len(openings) - 1:
+                out.write(",\n")
+
+    def space(self, out, space, last):
+        pass
+
+    def wall(self, out, w, last):
+        pass
+
+    def feature(self, out, f, last):
+        pass
+
+    def opening(self, out, o, last):
+        pass
+
+
+class SkeletonDocument(JsonLdDocument):
+    """Points and frames of the floor plan, see ``skeleton.json.jinja``"""
+
+    name = "skeleton.json"
+    metamodels = [
+        "https://comp-rob2b.github.io/metamodels/geometry/structural-entities.json"
+    ]
+
+    def graph(self, out, model):
+        write_point(out, "world-origin")
+        out.write(",\n")
+        write_frame(out, "world-frame", "world-origin")
+        out.write(",\n")
+        super().graph(out, model)
+
+    def frame(self, out, frame):
+        write_point(out, str(frame.origin.name))
+        out.write(",\n")
+        write_frame(out, str(frame.name), str(frame.origin.name))
+        out.write(",\n")
+
+    def space(self, out, space, last):
+        self.frame(out, space.frame)
+        for p in space.shape.points:
+            write_point(out, str(p.name))
+            out.write(",\n")
+
+    def wall(self, out, w, last):
+        self.frame(out, w.frame)
+        write_separated(
+            out, w.shape_3d.points, lambda out, p: write_point(out, str(p.name))
+        )
+        if not last:
+            out.write(",\n")
+
+    feature = wall
+
+    def opening(self, out, o, last):
+        self.frame(out, o.frame)
+        if o.shape_3d.points:
+            write_separated(
+                out, o.shape_3d.points, lambda out, p: write_point(out, str(p.name))
+            )
+
+
+class ShapeDocument(JsonLdDocument):
+    """Polygons of the floor plan, see ``shape.json.jinja``"""
+
+    name = "shape.json"
+    metamodels = ["https://secorolab.github.io/metamodels/geometry/polytope.json"]
+
+    def space(self, out, space, last):
+        write_polygon(out, space.shape)
+        out.write(",\n")
+
+    def wall(self, out, w, last):
+        write_polygon(out, w.shape)
+        if not last:
+            out.write(",\n")
+
+    feature = wall
+
+    def opening(self, out, o, last):
+        write_polygon(out, o.shape)
+
+
+class SpatialRelationsDocument(JsonLdDocument):
+    """Poses and positions between frames, see ``spatial_relations.json.jinja``"""
+
+    name = "spatial_relations.json"
+    metamodels = [
+        "https://comp-rob2b.github.io/metamodels/geometry/spatial-relations.json"
+    ]
+
+    def space(self, out, space, last):
+        write_pose_relation(out, space.pose)
+        out.write(",\n")
+        for position in space.shape_position_coords:
+            write_position_relation(out, position)
+            out.write(",\n")
+        for pose in space.wall_pose_coords:
+            write_pose_relation(out, pose)
+            out.write(",\n")
+
+    def wall(self, out, w, last):
+        positions = list(w.shape_position_coords)
+        for i, position in enumerate(positions):
+            write_position_relation(out, position)
+            if not last or i < len(positions) - 1:
+                out.write(",\n")
+
+    def feature(self, out, f, last):
+        write_pose_relation(out, f.pose)
+        out.write(",\n")
+        write_separated(out, f.shape_position_coords, write_position_relation)
+        if not last:
+            out.write(",\n")
+
+    def opening(self, out, o, last):
+        write_pose_relation(out, o.pose)
+        if not last or o.shape_position_coords:
+            out.write(",\n")
+        if o.shape_position_coords:
+            write_separated(out, o.shape_position_coords, write_position_relation)
+
+
+class FloorPlanDocument(JsonLdDocument):
+    """Elements of the floor plan, see ``floorplan.json.jinja``"""
+
+    name = "floorplan.json"
+    metamodels = [
+        "http://comp-rob2b.github.io/metamodels/qudt.json",
+        "https://secorolab.github.io/metamodels/floorplan/floorplan.json",
+    ]
+
+    def context(self, out, model):
+        # The template indents "@base" differently than the other documents
+        out.write('        {\n            "@base": "')
+        out.write(BASE_URL + str(model.name))
+        out.write('/",\n          "fpm": "')
+        out.write(BASE_URL + str(model.name))
+        out.write('/"\n        },\n')
+        out.write('        "' + '",\n        "'.join(self.metamodels) + '"\n')
+
+    def graph(self, out, model):
+        out.write('        {\n            "@id": "')
+        out.write(str(model.name))
+        out.write('",\n            "@type": "FloorPlan",\n            "spaces": [\n')
+        write_id_list(out, [s.name for s in model.spaces], "                ")
+        out.write("\n            ]")
+        if model.wall_openings:
+            out.write(',\n            "openings": [\n')
+            write_id_list(
+                out, [o.name for o in model.wall_openings], "                "
+            )
+            out.write("\n            ]\n")
+        out.write("        }")
+        out.write(",\n")
+        super().graph(out, model)
+        out.write("\n")
+
+    def space(self, out, space, last):
+        out.write('        {\n            "@id": "')
+        out.write(str(space.name))
+        out.write('",\n            "@type": "Space",\n            "walls": [\n')
+        write_id_list(out, [w.name for w in space.walls], "                ")
+        out.write('\n            ],\n            "feature": [\n')
+        write_id_list(out, [f.name for f in space.features], "                ")
+        out.write('\n            ],\n            "shape": "')
+        out.write(str(space.shape.name))
+        out.write('"\n        }')
+        out.write(",")
+
+    def element(self, out, element, thickness=True):
+        out.write('        {\n            "@id": "')
+        out.write(str(element.name))
+        out.write('",\n            "@type": "')
+        out.write(element.__class__.__name__)
+        out.write('",\n            "shape": "')
+        out.write(str(element.shape.name))
+        out.write('",\n            "3d-shape": "')
+        out.write(str(element.shape_3d.name))
+        if thickness:
+            out.write('",\n            "thickness": ')
+            out.write(str(element.thickness.value))
+            out.write(',\n            "height": ')
+        else:
+            out.write('",\n            "height": ')
+        out.write(str(element.height.value))
+        out.write(',\n            "unit": "M"\n        }')
+
+    def wall(self, out, w, last):
+        self.element(out, w)
+        if not last:
+            out.write(",\n")
+
+    def feature(self, out, f, last):
+        self.element(out, f, thickness=False)
+        if not last:
+            out.write(",\n")
+
+    def opening(self, out, o, last):
+        out.write('{\n  "@id": "')
+        out.write(str(o.name))
+        out.write('",\n  "@type": "')
+        out.write(o.__class__.__name__)
+        out.write('",\n  "shape": "')
+        out.write(str(o.shape.name))
+        out.write('",\n  "3d-shape": "')
+        out.write(str(o.shape_3d.name))
+        out.write('",\n  "thickness": ')
+        out.write(str(o.shape_3d.thickness.value))
+        out.write(',\n  "voids": [\n')
+        write_id_list(out, o.wall_ids, "      ")
+        out.write("\n  ]\n}")
+
+
+class CoordinateDocument(JsonLdDocument):
+    """Coordinates of the poses and positions, see ``coordinate.json.jinja``"""
+
+    name = "coordinate.json"
+    metamodels = [
+        "http://comp-rob2b.github.io/metamodels/qudt.json",
+        "https://comp-rob2b.github.io/metamodels/geometry/coordinates.json",
+        "https://secorolab.github.io/metamodels/geometry/coordinates.json",
+    ]
+
+    def pose(self, out, pose):
+        write_pose_coordinate(out, pose, self.angle_unit)
+
+    def space(self, out, space, last):
+        self.pose(out, space.pose)
+        out.write(",\n")
+        for position in space.shape_position_coords:
+            write_position_coordinate(out, position)
+            out.write(",\n")
+        for pose in space.wall_pose_coords:
+            self.pose(out, pose)
+            out.write(",\n")
+
+    def wall(self, out, w, last):
+        write_separated(out, w.shape_position_coords, write_position_coordinate)
+        if not last:
+            out.write(",\n")
+
+    def feature(self, out, f, last):
+        self.pose(out, f.pose)
+        out.write(",\n")
+        write_separated(out, f.shape_position_coords, write_position_coordinate)
+        if not last:
+            out.write(",\n")
+
+    def opening(self, out, o, last):
+        self.pose(out, o.pose)
+        if not last or o.shape_position_coords:
+            out.write(",\n")
+        if o.shape_position_coords:
+            write_separated(out, o.shape_position_coords, write_position_coordinate)
+
+
+class PolyhedronDocument(JsonLdDocument):
+    """3D shapes of the floor plan, see ``polyhedron.json.jinja``"""
+
+    name = "polyhedron.json"
+    metamodels = ["https://secorolab.github.io/metamodels/geometry/polytope.json"]
+
+    def context(self, out, model):
+        out.write('    {\n      "@base": "')
+        out.write(BASE_URL + str(model.name))
+        out.write('/",\n      "fpm": "')
+        out.write(BASE_URL + str(model.name))
+        out.write('/"\n    },\n')
+        out.write('    "' + self.metamodels[0] + '"\n')
+
+    def wall(self, out, w, last):
+        write_polyhedron(out, w.shape_3d)
+        if not last:
+            out.write(",\n")
+
+    def feature(self, out, f, last):
+        write_polyhedron(out, f.shape_3d)
+        if not last:
+            out.write(",\n")
+
+    def opening(self, out, o, last):
+        write_polyhedron(out, o.shape_3d)
+
+
+# Documents generated for each floor plan, in the order of JSONLD_TEMPLATES
+JSONLD_DOCUMENTS = [
+    SkeletonDocument,
+    ShapeDocument,
+    SpatialRelationsDocument,
+    FloorPlanDocument,
+    CoordinateDocument,
+    PolyhedronDocument,
+]
@@ -0,0 +1,288 @@
+"""
+Triangle meshes of floor plans
+
+The polyhedra of the walls and features of a floor plan are transformed to
+the world frame and triangulated, grouped by the number of vertices of
+their base: each group is transformed with one stack of matrices and
+triangulated in one pass by :func:`floorplan_dsl.utils.mesh.triangulate_prisms`.
+The meshes are written as binary STL, binary glTF (``.glb``) or glTF
+(``.gltf``, with the buffer embedded as a data URI) from the vertex and
+index buffers of all the elements at once.
+"""
+
+import base64
+import json
+import os
+import struct
+
+import numpy as np
+
+from textx import TextXSemanticError
+
+from floorplan_dsl.utils.dispatch import get_types
+from floorplan_dsl.utils.frames import get_frame_tree
+from floorplan_dsl.utils.mesh import triangulate_prisms
+from floorplan_dsl.utils.raster import get_circle_points
+from floorplan_dsl.utils.transformations import Transformation
+
+FORMATS = ["stl", "glb", "gltf"]
+
+# Number of vertices of the polygons that approximate circular features
+CIRCLE_SEGMENTS = 32
+
+# glTF is Y up, floor plans are Z up
+GLTF_AXES = np.array([[1.0, 0.0, 0.0], [0.0, 0.0, -1.0], [0.0, 1.0, 0.0]])
+
+GLTF_FLOAT = 5126
+GLTF_UNSIGNED_INT = 5125
+GLTF_ARRAY_BUFFER = 34962
+GLTF_ELEMENT_ARRAY_BUFFER = 34963
+
+STL_TRIANGLE = np.dtype(
+    [("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attribute", "<u2")]
+)
+
+
+class Mesh:
+    """Vertices and triangles of the elements of a floor plan
+
+    The vertices and triangles of all the elements are stored in two
+    contiguous buffers, with the range of each element.
+    """
+
+    def __init__(self, names, vertices, triangles, vertex_offsets, triangle_offsets):
+        self.names = names
+        self.vertices = vertices
+        self.triangles = triangles
+        self.vertex_offsets = vertex_offsets
+        self.triangle_offsets = triangle_offsets
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_element(self, i):
+        """Return the vertices and triangles of an element, indexed from its first vertex"""
+        v0, v1 = self.vertex_offsets[i], self.vertex_offsets[i + 1]
+        t0, t1 = self.triangle_offsets[i], self.triangle_offsets[i + 1]
+        return self.vertices[v0:v1], self.triangles[t0:t1] - v0
+
+
+def get_prism_coordinates(element):
+    """Return the (2n, 3) coordinates of the polyhedron of an element in its frame"""
+    polyhedron = element.shape_3d
+    if get_types(element).isinstance(polyhedron.base, "Circle"):
+        base = get_circle_points(polyhedron.base.radius.value, n=CIRCLE_SEGMENTS)
+        base = np.column_stack((base, np.zeros(CIRCLE_SEGMENTS)))
+        top = base.copy()
+        top[:, 2] = polyhedron.height.value
+        return np.vstack((base, top))
+    return polyhedron.coordinate_array
+
+
+def get_mesh_elements(model):
+    """Return the walls and features of a floor plan that have a polyhedron"""
+    elements = [w for s in model.spaces for w in s.walls]
+    elements.extend(f for s in model.spaces for f in s.features)
+    elements.extend(model.features)
+    return [e for e in elements if getattr(e, "shape_3d", None) is not None]
+
+
+def get_floorplan_mesh(model):
+    """Return the mesh of the walls and features of a floor plan in the world frame"""
+    frame_tree = get_frame_tree(model)
+    elements = get_mesh_elements(model)
+    if not elements:
+        raise TextXSemanticError(
+            "The floor plan {} has no polyhedra".format(model.name)
+        )
+
+    coordinates = [get_prism_coordinates(e) for e in elements]
+    tms = frame_tree.get_world_transformations([e.frame for e in elements])
+
+    # Elements with the same number of vertices are transformed and
+    # triangulated together
+    sizes = np.array([len(c) for c in coordinates])
+    vertices = [None] * len(elements)
+    triangles = [None] * len(elements)
+    for size in np.unique(sizes):
+        idx = np.flatnonzero(sizes == size)
+        group = np.array([coordinates[i] for i in idx])
+        world = Transformation.transform_points(tms[idx], group)
+        for i, v, t in zip(idx, world, triangulate_prisms(group)):
+            vertices[i] = v
+            triangles[i] = t
+
+    vertex_offsets = np.concatenate(([0], np.cumsum(sizes)))
+    triangle_offsets = np.concatenate(([0], np.cumsum([len(t) for t in triangles])))
+    triangles = np.concatenate([t + o for t, o in zip(triangles, vertex_offsets[:-1])])
+    return Mesh(
+        [e.name for e in elements],
+        np.concatenate(vertices),
+        triangles,
+        vertex_offsets,
+        triangle_offsets,
+    )
+
+
+def write_stl(path, vertices, triangles):
+    """Write a binary STL file of the triangles of a mesh"""
+    corners = vertices[triangles]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+    data = np.zeros(len(triangles), dtype=STL_TRIANGLE)
+    data["normal"] = normals
+    data["vertices"] = corners
+    with open(path, "wb") as f:
+        f.write(b"FloorPlan DSL mesh".ljust(80, b" "))
+        f.write(struct.pack("<I", len(triangles)))
+        data.tofile(f)
+
+
+def get_gltf(mesh, merge=True):
+    """Return the glTF document of a mesh and its binary buffer, as one mesh or one mesh per element"""
+    vertices = (mesh.vertices @ GLTF_AXES.T).astype("<f4")
+    if merge:
+        parts = [(None, vertices, mesh.triangles)]
+    else:
+        parts = list()
+        for i, name in enumerate(mesh.names):
+            v0, v1 = mesh.vertex_offsets[i], mesh.vertex_offsets[i + 1]
+            t0, t1 = mesh.triangle_offsets[i], mesh.triangle_offsets[i + 1]
+            parts.append((name, vertices[v0:v1], mesh.triangles[t0:t1] - v0))
+
+    # All the positions, then all the indices, in one buffer. The indices of
+    # each element start from its first vertex
+    indices = np.concatenate([t.ravel() for _, _, t in parts]).astype("<u4")
+    positions = vertices.tobytes()
+    gltf = {
+        "asset": {"version": "2.0", "generator": "floorplan-dsl"},
+        "scene": 0,
+        "scenes": [{"nodes": list(range(len(parts)))}],
+        "nodes": [],
+        "meshes": [],
+        "accessors": [],
+        "bufferViews": [
+            {
+                "buffer": 0,
+                "byteOffset": 0,
+                "byteLength": len(positions),
+                "target": GLTF_ARRAY_BUFFER,
+            },
+            {
+                "buffer": 0,
+                "byteOffset": len(positions),
+                "byteLength": indices.nbytes,
+                "target": GLTF_ELEMENT_ARRAY_BUFFER,
+            },
+        ],
+        "buffers": [{"byteLength": len(positions) + indices.nbytes}],
+    }
+
+    vertex_offset = index_offset = 0
+    for i, (name, v, t) in enumerate(parts):
+        gltf["accessors"].append(
+            {
+                "bufferView": 0,
+                "byteOffset": vertex_offset,
+                "componentType": GLTF_FLOAT,
+                "count": len(v),
+                "type": "VEC3",
+                "min": v.min(axis=0).tolist(),
+                "max": v.max(axis=0).tolist(),
+            }
+        )
+        gltf["accessors"].append(
+            {
+                "bufferView": 1,
+                "byteOffset": index_offset,
+                "componentType": GLTF_UNSIGNED_INT,
+                "count": t.size,
+                "type": "SCALAR",
+            }
+        )
+        mesh_desc = {
+            "primitives": [
+                {"attributes": {"POSITION": 2 * i}, "indices": 2 * i + 1, "mode": 4}
+            ]
+        }
+        node = {"mesh": i}
+        if name is not None:
+            mesh_desc["name"] = name
+            node["name"] = name
+        gltf["meshes"].append(mesh_desc)
+        gltf["nodes"].append(node)
+        vertex_offset += v.nbytes
+        index_offset += t.size * 4
+
+    return gltf, positions + indices.tobytes()
+
+
+def write_glb(path, mesh, merge=True):
+    """Write a binary glTF file of a mesh, as one mesh or one mesh per element"""
+    gltf, binary = get_gltf(mesh, merge)
+    header = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    header += b" " * (-len(header) % 4)
+    binary += b"\x00" * (-len(binary) % 4)
+
+    with open(path, "wb") as f:
+        f.write(
+            struct.pack("<III", 0x46546C67, 2, 12 + 8 + len(header) + 8 + len(binary))
+        )
+        f.write(struct.pack("<II", len(header), 0x4E4F534A))
+        f.write(header)
+        f.write(struct.pack("<II", len(binary), 0x004E4942))
+        f.write(binary)
+
+
+def write_gltf(path, mesh, merge=True):
+    """Write a glTF file of a mesh with its buffer embedded, as one mesh or one mesh per element"""
+    gltf, binary = get_gltf(mesh, merge)
+    gltf["buffers"][0]["uri"] = "data:application/octet-stream;base64,{}".format(
+        base64.b64encode(binary).decode("ascii")
+    )
+    with open(path, "w") as f:
+        json.dump(gltf, f, separators=(",", ":"))
+
+
+def mesh_generator(
+    metamodel, model, output_path, overwrite=True, debug=False, **custom_args
+):
+    os.makedirs(output_path, exist_ok=True)
+
+    if "{{model_name}}" in output_path:
+        output_path = output_path.replace("{{model_name}}", model.name)
+        os.makedirs(output_path, exist_ok=True)
+
+    mesh_format = custom_args.get("format", "glb")
+    if mesh_format not in FORMATS:
+        raise TextXSemanticError(
+            "Unknown mesh format {}, expected one of {}".format(
+                mesh_format, ", ".join(FORMATS)
+            )
+        )
+    split = custom_args.get("split", False)
+
+    mesh = get_floorplan_mesh(model)
+
+    gen_files = list()
+    if mesh_format == "glb":
+        f = os.path.join(output_path, "{}.glb".format(model.name))
+        write_glb(f, mesh, merge=not split)
+        gen_files.append(f)
+    elif mesh_format == "gltf":
+        f = os.path.join(output_path, "{}.gltf".format(model.name))
+        write_gltf(f, mesh, merge=not split)
+        gen_files.append(f)
+    elif split:
+        for i, name in enumerate(mesh.names):
+            f = os.path.join(output_path, "{}.stl".format(name))
+            write_stl(f, *mesh.get_element(i))
+            gen_files.append(f)
+    else:
+        f = os.path.join(output_path, "{}.stl".format(model.name))
+        write_stl(f, mesh.vertices, mesh.triangles)
+        gen_files.append(f)
+
+    return gen_files
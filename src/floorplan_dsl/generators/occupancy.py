@@ -0,0 +1,221 @@
+"""
+Occupancy grid maps of floor plans
+
+The footprints of the spaces, walls, entryways and features are projected
+on the (x, y) plane of the world frame and rasterized with
+:func:`floorplan_dsl.utils.raster.rasterize_polygon`. The grid is written as
+a binary PGM image with a YAML descriptor, as read by the ROS map_server.
+
+The image is filled one tile at a time through a memory map of the PGM file,
+with only the footprints around each tile, so that building-scale maps at
+a centimeter resolution are not held in memory at once.
+"""
+
+import os
+
+import numpy as np
+
+from textx import TextXSemanticError
+
+from floorplan_dsl.utils.dispatch import get_types
+from floorplan_dsl.utils.frames import get_frame_tree
+from floorplan_dsl.utils.raster import (
+    get_bounds,
+    get_circle_points,
+    rasterize_polygon,
+)
+from floorplan_dsl.utils.transformations import Transformation
+
+# Pixel values of the cells, for the thresholds of the YAML descriptor
+OCCUPIED = 0
+FREE = 254
+UNKNOWN = 205
+
+OCCUPIED_THRESHOLD = 0.65
+FREE_THRESHOLD = 0.196
+
+
+def get_polygon_points(shape, tm, resolution):
+    """Return the (n, 2) vertices of a shape in the (x, y) plane of the world frame"""
+    if get_types(shape).isinstance(shape, "Circle"):
+        radius = shape.radius.value
+        n = int(np.clip(np.ceil(2 * np.pi * radius / resolution), 16, 256))
+        return get_circle_points(radius, tm[:2, 3], n)
+
+    return Transformation.transform_points(tm, shape.coordinate_array)[:, :2]
+
+
+def get_entryway_points(entryway, tm, margin=0.0):
+    """Return the (4, 2) vertices of the passage of an entryway through its walls
+
+    The passage spans the width of the entryway and the thickness of its
+    walls, along the y axis of the entryway frame, extended by ``margin`` on
+    both sides of the walls.
+    """
+    x = entryway.shape.coordinate_array[:, 0]
+    t = entryway.shape_3d.thickness.value
+    corners = np.array(
+        [
+            [x.min(), -margin, 0.0],
+            [x.max(), -margin, 0.0],
+            [x.max(), t + margin, 0.0],
+            [x.min(), t + margin, 0.0],
+        ]
+    )
+    return Transformation.transform_points(tm, corners)[:, :2]
+
+
+def get_footprints(model, resolution, passage_margin=0.0):
+    """Return the footprints of a floor plan in the (x, y) plane of the world frame
+
+    Returns
+    -------
+    The lists of (n, 2) vertices of the spaces, of the walls, of the passages
+    of the entryways through their walls and of the features
+    """
+    frame_tree = get_frame_tree(model)
+    types = get_types(model)
+
+    def world(element):
+        return frame_tree.get_world_transformation(element.frame)
+
+    spaces = list(model.spaces)
+    walls = [w for s in spaces for w in s.walls]
+    entryways = [
+        o
+        for o in model.wall_openings
+        if types.isinstance(o, "Entryway") and o.shape_3d is not None
+    ]
+    features = [f for s in spaces for f in s.features]
+    features.extend(model.features)
+
+    return (
+        [get_polygon_points(s.shape, world(s), resolution) for s in spaces],
+        [get_polygon_points(w.shape, world(w), resolution) for w in walls],
+        [get_entryway_points(e, world(e), passage_margin) for e in entryways],
+        [get_polygon_points(f.shape, world(f), resolution) for f in features],
+    )
+
+
+def get_occupancy_layers(model, resolution):
+    """Return the footprints of a floor plan with the value of their cells
+
+    The layers are painted in order: the spaces are free, their walls are
+    occupied except for the passages of the entryways, and the features
+    (columns and dividers) are occupied.
+    """
+    spaces, walls, passages, features = get_footprints(model, resolution)
+    return [(FREE, spaces), (OCCUPIED, walls), (FREE, passages), (OCCUPIED, features)]
+
+
+def get_grid(polygons, resolution, margin=0.0):
+    """Return the grid that covers polygons
+
+    Returns
+    -------
+    The (x, y) coordinates of the lower left corner of the grid, and its
+    number of rows and columns
+    """
+    bounds = get_bounds(polygons)
+    if len(bounds) == 0:
+        raise TextXSemanticError("The floor plan has no footprint to rasterize")
+
+    origin = bounds[:, :2].min(axis=0) - margin
+    extent = bounds[:, 2:].max(axis=0) + margin - origin
+    cols, rows = np.ceil(extent / resolution).astype(int)
+    return origin, rows, cols
+
+
+def write_occupancy_grid(layers, path, resolution, margin=0.0, tile_size=1024):
+    """Rasterize the layers of footprints into a PGM image
+
+    Parameters
+    ----------
+    layers: list of (value, polygons) painted in order
+    path: the PGM file
+    resolution: size of the cells in meters
+    margin: unknown space around the footprints in meters
+    tile_size: number of rows and columns of the tiles
+
+    Returns
+    -------
+    The (x, y) coordinates of the lower left corner of the image
+    """
+    bounds = [get_bounds(polygons) for _, polygons in layers]
+    origin, rows, cols = get_grid(
+        [p for _, polygons in layers for p in polygons], resolution, margin
+    )
+
+    header = "P5\n{} {}\n255\n".format(cols, rows).encode("ascii")
+    with open(path, "wb") as f:
+        f.write(header)
+        f.truncate(len(header) + rows * cols)
+    image = np.memmap(path, dtype=np.uint8, mode="r+", offset=len(header))
+    image = image.reshape(rows, cols)
+
+    for r0 in range(0, rows, tile_size):
+        r1 = min(r0 + tile_size, rows)
+        for c0 in range(0, cols, tile_size):
+            c1 = min(c0 + tile_size, cols)
+            tile_origin = origin + np.array([c0, r0]) * resolution
+            tile_max = origin + np.array([c1, r1]) * resolution
+
+            tile = np.full((r1 - r0, c1 - c0), UNKNOWN, dtype=np.uint8)
+            for (value, polygons), b in zip(layers, bounds):
+                # Only the footprints whose bounds overlap the tile
+                around = np.flatnonzero(
+                    (b[:, 0] < tile_max[0])
+                    & (b[:, 2] > tile_origin[0])
+                    & (b[:, 1] < tile_max[1])
+                    & (b[:, 3] > tile_origin[1])
+                )
+                for i in around:
+                    mask = rasterize_polygon(
+                        polygons[i], tile_origin, resolution, tile.shape
+                    )
+                    tile[mask] = value
+
+            # The first row of the image is the top of the map
+            image[rows - r1 : rows - r0, c0:c1] = tile[::-1]
+
+    image.flush()
+    del image
+    return origin
+
+
+def write_map_descriptor(path, image, resolution, origin):
+    """Write the YAML descriptor of an occupancy grid image"""
+    with open(path, "w") as f:
+        f.write("image: {}\n".format(image))
+        f.write("resolution: {}\n".format(resolution))
+        f.write("origin: [{}, {}, 0.0]\n".format(origin[0], origin[1]))
+        f.write("negate: 0\n")
+        f.write("occupied_thresh: {}\n".format(OCCUPIED_THRESHOLD))
+        f.write("free_thresh: {}\n".format(FREE_THRESHOLD))
+        f.write("mode: trinary\n")
+
+
+def occupancy_grid_generator(
+    metamodel, model, output_path, overwrite=True, debug=False, **custom_args
+):
+    os.makedirs(output_path, exist_ok=True)
+
+    if "{{model_name}}" in output_path:
+        output_path = output_path.replace("{{model_name}}", model.name)
+        os.makedirs(output_path, exist_ok=True)
+
+    resolution = float(custom_args.get("resolution", 0.05))
+    margin = float(custom_args.get("margin", 0.5))
+    tile_size = int(custom_args.get("tile_size", 1024))
+    if resolution <= 0 or tile_size <= 0:
+        raise TextXSemanticError("The resolution and tile size must be positive")
+
+    image = "{}.pgm".format(model.name)
+    pgm_file = os.path.join(output_path, image)
+    yaml_file = os.path.join(output_path, "{}.yaml".format(model.name))
+
+    layers = get_occupancy_layers(model, resolution)
+    origin = write_occupancy_grid(layers, pgm_file, resolution, margin, tile_size)
+    write_map_descriptor(yaml_file, image, resolution, origin)
+
+    return [pgm_file, yaml_file]
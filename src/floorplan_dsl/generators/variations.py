@@ -1,14 +1,26 @@
 import sys
 import os
+import math
 
+from concurrent.futures import ProcessPoolExecutor
 from operator import attrgetter
 import numpy.random as random
 
-from textx import TextXSemanticError, get_children_of_type, metamodel_for_language
-from textx.scoping.tools import get_unique_named_object
+from textx import (
+    TextXSemanticError,
+    get_metamodel,
+    metamodel_for_language,
+)
 
 from textxjinja import textx_jinja_generator
 
+from floorplan_dsl.generators.fpm import jsonld_floorplan_generator
+from floorplan_dsl.processors.semantics.fpm2 import update_floorplan_semantics
+from floorplan_dsl.processors.validation.geometry import find_geometry_issues
+from floorplan_dsl.utils.params import get_bool_param
+from floorplan_dsl.utils.qudt import convert_model_angle_units
+from floorplan_dsl.utils.sampling import AcceptanceStats, SamplingPlan
+
 dir_path = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(dir_path)
 
@@ -19,76 +31,408 @@ def get_variable_from_fqn(obj, fqn):
     return f(obj)
 
 
-def new_sample(fp_model, var_model):
-    """Perform a sample of each distribution of the variation model"""
-
-    # For each variation set
-    for var in var_model.variations:
-        # If it's a variable, sample a new value for it
-        if var.__class__.__name__ == "VariableRef":
-            var_obj = get_unique_named_object(fp_model, var.ref.name)
-            var_obj.value = var.distribution.sample()
-            continue
-
-        # Otherwise select the of attributes
-        attributes = get_children_of_type("Attribute", var)
+def new_sample(fp_model, var_model, rng=random, plan=None):
+    """Perform a sample of each distribution of the variation model
 
-        for att in attributes:
-            fp_obj = get_unique_named_object(fp_model, var.ref.name)
-            var_obj = get_variable_from_fqn(fp_obj, att.fqn)
-            if var_obj.__class__.__name__ in ["LengthValue", "AngleValue"]:
-                var_obj.value.value = att.distribution.sample()
-            elif var_obj.__class__.__name__ in ["Length", "Angle"]:
-                var_obj.value = att.distribution.sample()
+    A compiled :class:`SamplingPlan` can be given to avoid resolving the
+    references of the variation model on every sample.
+    """
+    if plan is None:
+        plan = SamplingPlan.compile(fp_model, var_model)
+    plan.sample(rng)
 
 
-def variation_floorplan_generator(
-    metamodel, var_model, output_path, overwrite, debug, **custom_args
-):
+def get_floorplan_path(var_model):
+    """Return the path of the floor plan model imported by a variation model"""
+    model_folder_path = os.path.dirname(var_model._tx_parser.file_name)
+    return os.path.join(model_folder_path, var_model.import_uri.importURI)
 
-    if not os.path.exists(output_path):
-        os.makedirs(output_path)
 
-    model_folder_path = os.path.dirname(var_model._tx_parser.file_name)
-    fp_model_path = var_model.import_uri.importURI
+def load_floorplan_for_variation(var_model, processed=False):
+    """Load the floor plan imported by a variation model
 
+    Unless ``processed`` is set, the model is loaded without its object processors.
+    The object processors replace the ``location.wrt`` and ``location.of``
+    references with frames, which are needed to write the variation back as a .fpm model.
+    """
+    fp_model_path = get_floorplan_path(var_model)
     fp_mm = metamodel_for_language("fpm")
+    no_cache = get_bool_param(var_model._tx_model_params, "no_cache")
+    if processed:
+        return fp_mm.model_from_file(fp_model_path, no_cache=no_cache)
 
-    # Remove the object processors to have references to location.wrt and location.of
     old_obj_processors = fp_mm._obj_processors
     fp_mm._obj_processors = fp_mm._default_obj_processors
+    try:
+        fp_model = fp_mm.model_from_file(fp_model_path, no_cache=no_cache)
+    finally:
+        fp_mm._obj_processors = old_obj_processors
+
+    return fp_model
 
-    fp_model = fp_mm.model_from_file(os.path.join(model_folder_path, fp_model_path))
 
+def render_fpm_variation(
+    fp_model, output_path, overwrite, semantics_updated=False, **custom_args
+):
+    """Write the current sample of the floor plan as a .fpm model
+
+    The .fpm model is written without the semantics of the floor plan, so
+    ``semantics_updated`` is ignored.
+    """
     this_folder = os.path.dirname(__file__)
     template_folder = os.path.join(
         this_folder, "../templates/fpm2/__name_____seed__.fpm.jinja"
     )
 
-    variations = custom_args["variations"]
-    starting_seed = custom_args.get("seed", random.randint(1000, 9999))
+    context = dict(trim_blocks=True, lstrip_blocks=True)
+    context["model"] = fp_model
+    context["seed"] = fp_model.seed
+    context["name"] = fp_model.name
+    textx_jinja_generator(
+        template_folder,
+        output_path,
+        context,
+        overwrite=overwrite,
+    )
+    return [os.path.join(output_path, f"{fp_model.name}_{fp_model.seed}.fpm")]
+
+
+def render_jsonld_variation(
+    fp_model, output_path, overwrite, semantics_updated=False, **custom_args
+):
+    """Recompute the semantics of the current sample in memory and write it as json-ld
+
+    The semantics are not recomputed if ``semantics_updated`` is set, when
+    the caller already updated them for the current sample. With
+    ``drop-invalid``, samples with overlapping spaces, features outside
+    their space or openings outside their walls are reported and not written.
+    """
+    if not semantics_updated:
+        update_floorplan_semantics(fp_model)
+
+    if custom_args.get("drop-invalid", False):
+        issues = find_geometry_issues(fp_model)
+        if issues:
+            print(
+                "Dropping variation {}_{}: {}".format(
+                    fp_model.name, fp_model.seed, "; ".join(str(i) for i in issues)
+                ),
+                file=sys.stderr,
+            )
+            return []
+
+    variation_path = os.path.join(output_path, f"{fp_model.name}_{fp_model.seed}")
+    files = jsonld_floorplan_generator(
+        get_metamodel(fp_model), fp_model, variation_path, overwrite, **custom_args
+    )
+
+    # The generator converts the angles to the requested unit, but the
+    # semantics of the next sample are computed in radians
+    convert_model_angle_units(fp_model, "rad")
+
+    return files
+
+
+variation_renderers = {
+    "fpm": render_fpm_variation,
+    "json-ld": render_jsonld_variation,
+}
+
+
+def generate_variations(
+    fp_model,
+    var_model,
+    seeds,
+    output_path,
+    overwrite,
+    parameters=None,
+    target="fpm",
+    custom_args=None,
+):
+    """Sample and render one variation of the floor plan for each seed
+
+    Each variation draws its values from its own random stream seeded with
+    ``seed``, so the result does not depend on which process renders it.
+    If a pre-sampled ``parameters`` matrix is given, row ``i`` is applied to
+    the model for ``seeds[i]`` instead.
+    """
+    if custom_args is None:
+        custom_args = dict()
+    render = variation_renderers[target]
+    plan = SamplingPlan.compile(fp_model, var_model)
 
     files = []
-    seed = int(starting_seed)
-    for i in range(int(variations)):
-        random.seed(seed)
+    for i, seed in enumerate(seeds):
         fp_model.seed = seed
-        new_sample(fp_model, var_model)
-        context = dict(trim_blocks=True, lstrip_blocks=True)
-        context["model"] = fp_model
-        context["seed"] = seed
-        context["name"] = fp_model.name
-        textx_jinja_generator(
-            template_folder,
+        if parameters is None:
+            new_sample(fp_model, var_model, random.RandomState(seed), plan)
+        else:
+            plan.apply(parameters[i])
+        files.extend(render(fp_model, output_path, overwrite, **custom_args))
+
+    return files
+
+
+def generate_valid_variations(
+    fp_model,
+    var_model,
+    starting_seed,
+    variations,
+    output_path,
+    overwrite,
+    target="fpm",
+    custom_args=None,
+    max_attempts=None,
+):
+    """Sample consecutive seeds and render only the valid variations, until ``variations`` are accepted
+
+    After each sample the semantics of the floor plan are recomputed in
+    memory and its geometry is checked (overlapping spaces, features outside
+    their space, openings outside their walls). For the ``fpm`` target the
+    floor plan is rendered without its semantics, so the samples are also
+    written into a processed copy of the floor plan to be checked. An
+    accepted seed renders the same variation as without rejection sampling.
+
+    Returns
+    -------
+    the generated files and the :class:`AcceptanceStats` of the samples
+    """
+    if custom_args is None:
+        custom_args = dict()
+    if max_attempts is None:
+        max_attempts = 100 * variations
+    render = variation_renderers[target]
+    plan = SamplingPlan.compile(fp_model, var_model)
+
+    if target == "fpm":
+        check_model = load_floorplan_for_variation(var_model, processed=True)
+        check_plan = SamplingPlan.compile(check_model, var_model)
+    else:
+        check_model = fp_model
+        check_plan = plan
+    stats = AcceptanceStats(check_plan)
+
+    files = []
+    seed = starting_seed
+    while stats.accepted < variations and stats.samples < max_attempts:
+        new_sample(fp_model, var_model, random.RandomState(seed), plan)
+        if check_plan is not plan:
+            check_plan.apply(plan.values)
+        update_floorplan_semantics(check_model)
+
+        issues = find_geometry_issues(check_model)
+        if issues:
+            rejected = set()
+            for issue in issues:
+                rejected.update(issue.elements)
+                # Walls and features also depend on the attributes of their space
+                rejected.update(e.parent for e in issue.elements)
+            stats.add(rejected)
+        else:
+            stats.add()
+            fp_model.seed = seed
+            # The json-ld target checks the floor plan itself, whose
+            # semantics are already updated for this sample
+            files.extend(
+                render(
+                    fp_model,
+                    output_path,
+                    overwrite,
+                    semantics_updated=check_model is fp_model,
+                    **custom_args,
+                )
+            )
+        seed = seed + 1
+
+    if stats.accepted < variations:
+        print(
+            "Only {} of {} variations are valid after {} samples".format(
+                stats.accepted, variations, stats.samples
+            ),
+            file=sys.stderr,
+        )
+
+    return files, stats
+
+
+# Models of a worker process, loaded once by the pool initializer
+_worker_models = dict()
+
+
+def _init_variation_worker(var_model_path, target, no_cache):
+    var_mm = metamodel_for_language("fpm-variation")
+    var_model = var_mm.model_from_file(var_model_path, no_cache=no_cache)
+    fp_model = load_floorplan_for_variation(var_model, processed=target != "fpm")
+    _worker_models["var_model"] = var_model
+    _worker_models["fp_model"] = fp_model
+
+
+def _generate_variations_in_worker(
+    seeds, output_path, overwrite, parameters, target, custom_args
+):
+    return generate_variations(
+        _worker_models["fp_model"],
+        _worker_models["var_model"],
+        seeds,
+        output_path,
+        overwrite,
+        parameters,
+        target,
+        custom_args,
+    )
+
+
+def split_seeds(seeds, jobs, chunks_per_job=4):
+    """Split a range of seeds into contiguous chunks to be distributed over ``jobs`` workers"""
+    chunk_size = max(1, math.ceil(len(seeds) / (jobs * chunks_per_job)))
+    return [seeds[i : i + chunk_size] for i in range(0, len(seeds), chunk_size)]
+
+
+def generate_variations_in_parallel(
+    var_model,
+    seeds,
+    output_path,
+    overwrite,
+    jobs,
+    parameters=None,
+    target="fpm",
+    custom_args=None,
+):
+    """Distribute the seeds over a pool of ``jobs`` worker processes
+
+    Each worker parses the variation and floor plan models once and renders
+    the chunks of seeds assigned to it, together with their rows of the
+    ``parameters`` matrix if given. Files are returned in seed order.
+    """
+    var_model_path = var_model._tx_parser.file_name
+    no_cache = get_bool_param(var_model._tx_model_params, "no_cache")
+    files = []
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_variation_worker,
+        initargs=(var_model_path, target, no_cache),
+    ) as executor:
+        futures = list()
+        start = 0
+        for chunk in split_seeds(seeds, jobs):
+            rows = None
+            if parameters is not None:
+                rows = parameters[start : start + len(chunk)]
+            futures.append(
+                executor.submit(
+                    _generate_variations_in_worker,
+                    chunk,
+                    output_path,
+                    overwrite,
+                    rows,
+                    target,
+                    custom_args,
+                )
+            )
+            start = start + len(chunk)
+        for future in futures:
+            files.extend(future.result())
+
+    return files
+
+
+def run_variation_generator(var_model, output_path, overwrite, target, custom_args):
+    """Generate the variations of a variation model for one of the ``variation_renderers`` targets"""
+    os.makedirs(output_path, exist_ok=True)
+
+    variations = custom_args["variations"]
+    starting_seed = custom_args.get("seed", random.randint(1000, 9999))
+    jobs = int(custom_args.get("jobs", 1))
+    if jobs < 1:
+        raise TextXSemanticError("The number of jobs must be a positive integer")
+
+    seeds = range(int(starting_seed), int(starting_seed) + int(variations))
+    processed = target != "fpm"
+    if custom_args.get("drop-invalid", False) and not processed:
+        raise TextXSemanticError(
+            "Invalid variations can only be dropped with the json-ld target"
+        )
+
+    if custom_args.get("reject-invalid", False):
+        if (
+            jobs > 1
+            or custom_args.get("presample", False)
+            or "parameters" in custom_args
+        ):
+            raise TextXSemanticError(
+                "Rejection sampling cannot be combined with --jobs, --presample or --parameters"
+            )
+        fp_model = load_floorplan_for_variation(var_model, processed)
+        max_attempts = custom_args.get("max_attempts")
+        files, stats = generate_valid_variations(
+            fp_model,
+            var_model,
+            int(starting_seed),
+            int(variations),
             output_path,
-            context,
-            overwrite=overwrite,
+            overwrite,
+            target,
+            custom_args,
+            None if max_attempts is None else int(max_attempts),
         )
-        v = os.path.join(output_path, f"{fp_model.name}_{fp_model.seed}.fpm")
-        files.append(v)
-        seed = seed + 1
+        stats.report()
+        return get_floorplan_path(var_model), files
+
+    fp_model = None
+    parameters = None
+    if custom_args.get("presample", False) or "parameters" in custom_args:
+        # Draw all variations at once from a single stream seeded with the starting seed
+        fp_model = load_floorplan_for_variation(var_model, processed)
+        plan = SamplingPlan.compile(fp_model, var_model)
+        parameters = plan.sample_matrix(len(seeds), random.RandomState(seeds[0]))
+        if "parameters" in custom_args:
+            plan.save_matrix(custom_args["parameters"], parameters, seeds)
+
+    if jobs == 1 or len(seeds) == 1:
+        if fp_model is None:
+            fp_model = load_floorplan_for_variation(var_model, processed)
+        files = generate_variations(
+            fp_model,
+            var_model,
+            seeds,
+            output_path,
+            overwrite,
+            parameters,
+            target,
+            custom_args,
+        )
+    else:
+        files = generate_variations_in_parallel(
+            var_model,
+            seeds,
+            output_path,
+            overwrite,
+            min(jobs, len(seeds)),
+            parameters,
+            target,
+            custom_args,
+        )
+
+    return get_floorplan_path(var_model), files
 
-    fp_mm._obj_processors = old_obj_processors
 
-    f = os.path.join(model_folder_path, fp_model_path)
-    return f, files
+def variation_floorplan_generator(
+    metamodel, var_model, output_path, overwrite, debug, **custom_args
+):
+    return run_variation_generator(
+        var_model, output_path, overwrite, "fpm", custom_args
+    )
+
+
+def variation_jsonld_generator(
+    metamodel, var_model, output_path, overwrite, debug, **custom_args
+):
+    """Generate the json-ld models of the variations without writing and parsing .fpm models
+
+    The floor plan is loaded once with its object processors. After each
+    sample, its derived semantics (wall shapes, poses, polyhedra) are
+    recomputed in memory and passed to the json-ld generator.
+    """
+    return run_variation_generator(
+        var_model, output_path, overwrite, "json-ld", custom_args
+    )
@@ -3,9 +3,9 @@ import math
 
 import numpy as np
 from textx.exceptions import TextXSemanticError
-from textx import textx_isinstance, get_metamodel, get_model
-from textx.scoping.tools import get_unique_named_object
+from textx import get_model
 
+from floorplan_dsl.classes.fpm2 import DerivedAttribute
 from floorplan_dsl.classes.fpm2.geometry import (
     PointCoordinate,
     EulerAngles,
@@ -17,7 +17,16 @@ from floorplan_dsl.classes.fpm2.geometry import (
     Polyhedron,
 )
 
-from floorplan_dsl.utils.geometry import get_intersection, get_angle_between_vectors
+from floorplan_dsl.utils.geometry import (
+    get_angle_between_vectors,
+    get_angles_wrt_x_axis,
+    get_homogeneous_lines,
+    get_line_intersections,
+)
+from floorplan_dsl.utils.cache import CacheStats
+from floorplan_dsl.utils.dispatch import get_types
+from floorplan_dsl.utils.index import get_model_index, invalidate_model_index
+from floorplan_dsl.utils.params import get_bool_param
 from floorplan_dsl.utils.transformations import Transformation
 
 
@@ -41,16 +50,125 @@ def opening_obj_processor(opening):
     opening.pose = opening.get_pose_coord_wrt_location()
 
 
+def get_wall_frame(frame):
+    return frame.space.walls[frame.wall_idx].frame
+
+
+def get_space_frame(frame):
+    return frame.space.frame
+
+
+# Frames of the walls and spaces that the references of the locations resolve to
+REFERENCE_FRAMES = (("WallFrame", get_wall_frame), ("SpaceFrame", get_space_frame))
+
+
+def get_wall_cache_stats(model):
+    """Return the hit and miss counters of the pose and transformation caches of the walls of a model"""
+    stats = getattr(model, "wall_cache_stats", None)
+    if stats is None:
+        stats = CacheStats()
+        model.wall_cache_stats = stats
+    return stats
+
+
 def process_angle_units(v):
-    mm = get_metamodel(v)
+    types = get_types(v)
     if (
-        textx_isinstance(v, mm["AngleVariable"]) or textx_isinstance(v, mm["Angle"])
+        types.isinstance(v, "AngleVariable") or types.isinstance(v, "Angle")
     ) and v.unit == "deg":
+        # Keep the unit of the model, e.g. to sample variations in that unit
+        v.declared_unit = v.unit
         v.value = np.deg2rad(v.value)
         v.unit = "rad"
 
 
+def get_bool_model_param(model, name, default=False):
+    """Return the value of a boolean model parameter, see :func:`get_bool_param`"""
+    return get_bool_param(model._tx_model_params, name, default)
+
+
+def geometry_model_processor(model, metamodel):
+    """Compute the derived geometry of the elements of a loaded model, or defer it
+
+    The shapes of the walls, the points, position coordinates and polyhedra
+    of the elements are computed on their first access, or right away when
+    the model is loaded with ``eager_geometry=True``. textX follows the
+    containment attributes of the model, such as the polyhedra and points
+    of the elements, while it loads the model, so the geometry is only
+    computed or dropped once the model is loaded.
+    """
+    eager = get_bool_model_param(model, "eager_geometry")
+    for space in model.spaces:
+        if eager:
+            space.compute_wall_geometry()
+            space.compute_geometry()
+        else:
+            space.reset_geometry()
+            for w in space.walls:
+                w.reset_geometry()
+
+    features = [f for s in model.spaces for f in s.features]
+    for element in itertools.chain(features, model.features, model.wall_openings):
+        if eager:
+            element.compute_geometry()
+        else:
+            element.reset_geometry()
+
+
+def update_floorplan_semantics(model):
+    """Recompute the derived semantics of a processed model after its values changed
+
+    Updates the rectangle coordinates, wall shapes, shape points, polyhedra
+    and pose coordinates of every space, feature and opening in place, e.g.
+    after a new sample of a variation model has been written into the model.
+    """
+    types = get_types(model)
+    # The frame tree is built again from the new poses on its next use, and
+    # the name index from the new polyhedra
+    model.frame_tree = None
+    invalidate_model_index(model)
+    for space in model.spaces:
+        if types.isinstance(space.shape, "Rectangle"):
+            space.shape.update_point_coordinates()
+        frames = space.get_wall_frame_arrays()
+        space.compute_outer_wall_edges(frames)
+        space.process_shape_semantics()
+        space.compute_3d_shape()
+        space.wall_pose_coords = space.get_wall_poses(frames)
+        space.pose = space.get_pose_coord_wrt_location()
+
+        for feature in space.features:
+            if types.isinstance(feature.shape, "Rectangle"):
+                feature.shape.update_point_coordinates()
+            feature.process_shape_semantics()
+            feature.compute_3d_shape()
+            feature.pose = feature.get_pose_coord_wrt_location()
+
+    for opening in model.wall_openings:
+        if types.isinstance(opening.shape, "Rectangle"):
+            opening.shape.update_point_coordinates()
+        opening.process_shape_semantics()
+        opening.compute_3d_shape()
+        opening.pose = opening.get_pose_coord_wrt_location()
+
+
 class FloorPlanElement:
+    # Derived geometry, computed on its first access by compute_geometry
+    # unless the model is loaded with eager_geometry=True (see
+    # geometry_model_processor)
+    shape_position_coords = DerivedAttribute("compute_geometry")
+
+    def compute_geometry(self):
+        self.process_shape_semantics()
+        self.compute_3d_shape()
+        # The index of the model does not hold the new shapes and points yet
+        invalidate_model_index(get_model(self))
+
+    def reset_geometry(self):
+        """Drop the derived geometry of the element, to be computed again on its first access"""
+        del self.shape_position_coords
+        del self.shape.points
+
     def set_shape_points(self, start=0):
 
         points = list()
@@ -79,34 +197,38 @@ class FloorPlanElement:
 
 
 class SpaceSemantics(FloorPlanElement):
+    def compute_geometry(self):
+        self.process_shape_semantics()
+        invalidate_model_index(get_model(self))
+
+    def compute_wall_geometry(self):
+        """Compute the shapes, points, position coordinates and polyhedra of all the walls"""
+        self.compute_outer_wall_edges()
+        self.compute_3d_shape()
+        invalidate_model_index(get_model(self))
+
     def process_location(self):
-        mm = get_metamodel(self)
+        types = get_types(self)
         m = get_model(self)
 
-        if textx_isinstance(self.location.of, mm["WallFrame"]):
-            self.location.of = self.location.of.space.walls[
-                self.location.of.wall_idx
-            ].frame
-        elif textx_isinstance(self.location.of, mm["SpaceFrame"]):
-            self.location.of = self.location.of.space.frame
-        else:
+        get_frame = types.get_handler(self.location.of, REFERENCE_FRAMES)
+        if get_frame is None:
             raise TextXSemanticError(
                 "Can't find 'of' frame for space {}".format(self.name)
             )
+        self.location.of = get_frame(self.location.of)
 
-        if textx_isinstance(self.location.wrt, mm["WorldFrame"]):
+        if types.isinstance(self.location.wrt, "WorldFrame"):
             if m.frame is None:
                 m.frame = Frame(m, "world")
                 self.location.wrt = m.frame
             else:
-                wf = get_unique_named_object(m, "world-frame")
+                wf = get_model_index(m).get_unique("world-frame")
                 self.location.wrt = wf
-        elif textx_isinstance(self.location.wrt, mm["WallFrame"]):
-            self.location.wrt = self.location.wrt.space.walls[
-                self.location.wrt.wall_idx
-            ].frame
-        elif textx_isinstance(self.location.wrt, mm["SpaceFrame"]):
-            self.location.wrt = self.location.wrt.space.frame
+        else:
+            get_frame = types.get_handler(self.location.wrt, REFERENCE_FRAMES)
+            if get_frame is not None:
+                self.location.wrt = get_frame(self.location.wrt)
 
     def get_pose_coord_wrt_location(self):
         # TODO This might be an alternative to replacing model data in the obj_processor
@@ -123,11 +245,11 @@ class SpaceSemantics(FloorPlanElement):
         else:
             y = 0
 
-        mm = get_metamodel(self)
+        types = get_types(self)
 
         # Check if two walls are being used as frames of reference
-        if textx_isinstance(self.location.of.parent, mm["Wall"]) and textx_isinstance(
-            self.location.wrt.parent, mm["Wall"]
+        if types.isinstance(self.location.of.parent, "Wall") and types.isinstance(
+            self.location.wrt.parent, "Wall"
         ):
 
             # If the walls are spaced, the translation in y should include the thickness of both walls
@@ -150,24 +272,65 @@ class SpaceSemantics(FloorPlanElement):
             self, self.location.of, self.location.wrt, translation, rotation
         )
 
-    def get_wall_poses(self):
-        pose_coords = list()
-        for w in self.walls:
-            pose_coords.append(w.get_pose_coord_wrt_parent())
-        return pose_coords
+    def get_wall_frame_arrays(self):
+        """Return the frames of all the walls of the space as arrays
+
+        Returns
+        -------
+        origins: (n, 2) array with the origin of each wall frame wrt the space frame
+        rotations: (n,) array with the rotation of each wall frame wrt the space frame
+        widths: (n,) array with the width of each wall
+        """
+        values = np.array([w._get_point_values() for w in self.walls], dtype=float)
+        p1, p2 = values[:, :2], values[:, 2:]
+        origins = (p1 + p2) / 2
+        rotations = get_angles_wrt_x_axis(p2 - p1)
+        widths = np.hypot(p2[:, 0] - p1[:, 0], p2[:, 1] - p1[:, 1])
+        return origins, rotations, widths
+
+    def get_wall_transformation_matrices(self, frames=None):
+        """Return the (n, 4, 4) stack of the transformation matrices of the wall frames wrt the space frame"""
+        if frames is None:
+            frames = self.get_wall_frame_arrays()
+        origins, rotations, _ = frames
+        return Transformation.get_planar_transformation_matrices(
+            origins[:, 0], origins[:, 1], rotations
+        )
 
-    def _get_outer_wall_points(self):
-        outer_wall_points = list()
-        for i, wall in enumerate(self.walls):
-            prev_wall = self.walls[i - 1]
-            a1, a2 = wall.get_points_in_outer_wall_line_wrt_space_frame()
-            b1, b2 = prev_wall.get_points_in_outer_wall_line_wrt_space_frame()
+    def get_wall_poses(self, frames=None):
+        if frames is None:
+            frames = self.get_wall_frame_arrays()
+        origins, rotations, _ = frames
 
-            # Find intersection between the two lines
-            x, y = get_intersection(a1, a2, b1, b2)
-            outer_wall_points.append((x, y))
+        pose_coords = list()
+        for w, (x, y), rotation in zip(self.walls, origins, rotations):
+            pose_coords.append(w.get_pose_coord_wrt_parent((x, y, rotation)))
+        return pose_coords
 
-        return outer_wall_points
+    def _get_outer_wall_points(self, frames=None):
+        """Return the (n, 2) array of the outer corners of the walls wrt the space frame
+
+        Corner ``i`` is the intersection of the outer lines of wall ``i`` and
+        of the previous wall, all computed in a few batched operations.
+        """
+        if frames is None:
+            frames = self.get_wall_frame_arrays()
+        origins, rotations, widths = frames
+        cos, sin = np.cos(rotations), np.sin(rotations)
+        thickness = np.array([w.thickness.value for w in self.walls], dtype=float)
+
+        # Points of the outer line of each wall, (-width/2, thickness) and
+        # (width/2, thickness) wrt the wall frame, transformed to the space frame.
+        # The terms are summed as in the product with the 4x4 transformation matrix
+        x = widths / 2
+        tx = -sin * thickness + origins[:, 0]
+        ty = cos * thickness + origins[:, 1]
+        a1 = np.column_stack((cos * -x + tx, sin * -x + ty))
+        a2 = np.column_stack((cos * x + tx, sin * x + ty))
+
+        # Intersect the outer line of each wall with the one of the previous wall
+        lines = get_homogeneous_lines(a1, a2)
+        return get_line_intersections(lines, np.roll(lines, 1, axis=0))
 
     @staticmethod
     def get_wall_edges(coordinates):
@@ -181,13 +344,30 @@ class SpaceSemantics(FloorPlanElement):
 
         return edges
 
-    def compute_outer_wall_edges(self):
-        outer_wall_points = self._get_outer_wall_points()
-        outer_edges = self.get_wall_edges(outer_wall_points)
-        for edge, wall in zip(outer_edges, self.walls):
+    def compute_outer_wall_edges(self, frames=None):
+        if frames is None:
+            frames = self.get_wall_frame_arrays()
+        origins, rotations, _ = frames
+        cos, sin = np.cos(rotations), np.sin(rotations)
+
+        # The outer edge of wall i goes from corner i to corner i + 1
+        p1 = self._get_outer_wall_points(frames)
+        p2 = np.roll(p1, -1, axis=0)
+
+        # Rotate the edges back to each wall frame, after translating them to its origin
+        d1 = p1 - origins
+        d2 = p2 - origins
+        edges = np.column_stack(
+            (
+                cos * d1[:, 0] + sin * d1[:, 1],
+                -sin * d1[:, 0] + cos * d1[:, 1],
+                cos * d2[:, 0] + sin * d2[:, 1],
+                -sin * d2[:, 0] + cos * d2[:, 1],
+            )
+        )
 
-            outer_edge_wrt_wall_frame = wall.get_outer_edge_points(edge)
-            wall.compute_2d_shape(outer_edge_wrt_wall_frame)
+        for edge, wall in zip(edges, self.walls):
+            wall.compute_2d_shape(tuple(edge))
             wall.process_shape_semantics()
 
     def compute_3d_shape(self):
@@ -196,19 +376,62 @@ class SpaceSemantics(FloorPlanElement):
 
 
 class WallSemantics(FloorPlanElement):
+    # The shapes of the walls depend on the neighbouring walls, they are
+    # computed for all the walls of the space at once
+    shape = DerivedAttribute("compute_geometry")
+    shape_3d = DerivedAttribute("compute_geometry")
+
+    def compute_geometry(self):
+        self.parent.compute_wall_geometry()
+
+    def reset_geometry(self):
+        del self.shape
+        del self.shape_3d
+        del self.shape_position_coords
 
     def process_semantics(self):
         self.process_shape_semantics()
 
+    @property
+    def cache_stats(self):
+        """Hits and misses of the pose and transformation caches of the walls of the model"""
+        return get_wall_cache_stats(get_model(self))
+
+    def invalidate_cache(self):
+        """Drop the cached pose coordinates and transformation matrix of the wall frame
+
+        The cache is also checked against the current points of the wall on
+        each lookup, which are all the pose depends on, so a new variation
+        sample is picked up without calling this method.
+        """
+        self._cache_key = None
+        self._cached_pose = None
+        self._cached_transformation = None
+
+    def _check_cache(self):
+        key = self._get_point_values()
+        if key != self._cache_key:
+            self.invalidate_cache()
+            self._cache_key = key
+
     def _get_points_in_outer_wall_line(self):
         x = self.width / 2
         return -x, self.thickness.value, x, self.thickness.value
 
     def get_transformation_matrix_wrt_parent(self):
-        # Get transformation matrix of wall frame wrt space
-        return Transformation.get_transformation_matrix_from_model(
+        """Return the (cached, read-only) transformation matrix of the wall frame wrt the space"""
+        self._check_cache()
+        if self._cached_transformation is not None:
+            self.cache_stats.hits += 1
+            return self._cached_transformation
+
+        self.cache_stats.misses += 1
+        tm = Transformation.get_transformation_matrix_from_model(
             self.get_pose_coord_wrt_parent()
         )
+        tm.flags.writeable = False
+        self._cached_transformation = tm
+        return tm
 
     def get_points_in_outer_wall_line_wrt_space_frame(self):
         x1, y1, x2, y2 = self._get_points_in_outer_wall_line()
@@ -253,21 +476,17 @@ class WallSemantics(FloorPlanElement):
         return x1_wall, y1_wall, x2_wall, y2_wall
 
     def compute_2d_shape(self, outer_edge):
-        poly = SimplePolygon(self, list(), None)
-
         x = self.width / 2
         x1, y1, x2, y2 = outer_edge
 
         coords = [
-            PointCoordinate(poly, x1, y1, 0.0),
-            PointCoordinate(poly, x2, y2, 0.0),
-            PointCoordinate(poly, x, 0.0, 0.0),
-            PointCoordinate(poly, -x, 0.0, 0.0),
+            [x1, y1, 0.0],
+            [x2, y2, 0.0],
+            [x, 0.0, 0.0],
+            [-x, 0.0, 0.0],
         ]
 
-        poly.coordinates = coords
-
-        self.shape = poly
+        self.shape = SimplePolygon(self, list(), None, coordinate_array=coords)
 
     def _get_point_values(self):
         x1 = self.points[0].x.value
@@ -302,13 +521,28 @@ class WallSemantics(FloorPlanElement):
         rotation = self.get_frame_rotation_wrt_parent_value()
         return x, y, rotation
 
-    def get_pose_coord_wrt_parent(self):
-        x, y, rotation = self.get_wall_origin_pose_coord_values()
+    def get_pose_coord_wrt_parent(self, values=None):
+        """Return the (cached) pose coordinates of the wall frame wrt the space
+
+        Parameters
+        ----------
+        values: optional (x, y, rotation) of the pose if already computed, used on a cache miss
+        """
+        self._check_cache()
+        if self._cached_pose is not None:
+            self.cache_stats.hits += 1
+            return self._cached_pose
+
+        self.cache_stats.misses += 1
+        if values is None:
+            values = self.get_wall_origin_pose_coord_values()
+        x, y, rotation = values
         rotation = EulerAngles(self, z=rotation)
         translation = PointCoordinate(self, x, y)
-        return PoseCoordinate(
+        self._cached_pose = PoseCoordinate(
             self, self.frame, self.parent.frame, translation, rotation
         )
+        return self._cached_pose
 
     def compute_3d_shape(self):
         self.shape_3d = Polyhedron(self, self.shape, self.height)
@@ -316,15 +550,16 @@ class WallSemantics(FloorPlanElement):
 
 
 class FeatureSemantics(FloorPlanElement):
-    def process_location(self):
-        mm = get_metamodel(self)
+    shape_3d = DerivedAttribute("compute_geometry")
+
+    def reset_geometry(self):
+        super().reset_geometry()
+        del self.shape_3d
 
-        if textx_isinstance(self.location.wrt, mm["WallFrame"]):
-            self.location.wrt = self.location.wrt.space.walls[
-                self.location.wrt.wall_idx
-            ].frame
-        elif textx_isinstance(self.location.wrt, mm["SpaceFrame"]):
-            self.location.wrt = self.location.wrt.space.frame
+    def process_location(self):
+        get_frame = get_types(self).get_handler(self.location.wrt, REFERENCE_FRAMES)
+        if get_frame is not None:
+            self.location.wrt = get_frame(self.location.wrt)
 
     def get_pose_coord_wrt_location(self):
         # TODO This might be an alternative to replacing model data in the obj_processor
@@ -346,8 +581,14 @@ class FeatureSemantics(FloorPlanElement):
 
 
 class OpeningSemantics(FloorPlanElement):
+    shape_3d = DerivedAttribute("compute_geometry")
+
+    def reset_geometry(self):
+        super().reset_geometry()
+        del self.shape_3d
+
     def process_location(self):
-        mm = get_metamodel(self)
+        types = get_types(self)
         if len(self.location.walls) > 2:
             raise TextXSemanticError("Wrong number of walls")
 
@@ -355,7 +596,7 @@ class OpeningSemantics(FloorPlanElement):
         self.wall_ids = list()
 
         for w in self.location.walls:
-            if textx_isinstance(w, mm["WallFrame"]):
+            if types.isinstance(w, "WallFrame"):
                 frames.append(w.space.walls[w.wall_idx].frame)
                 self.wall_ids.append(w.space.walls[w.wall_idx].name)
             else:
@@ -377,15 +618,22 @@ class OpeningSemantics(FloorPlanElement):
             self, self.frame, self.location.walls[0], translation, rotation
         )
 
+    def get_walls(self):
+        types = get_types(self)
+        walls = list()
+        for w in self.location.walls:
+            if types.isinstance(w, "WallFrame"):
+                walls.append(w.space.walls[w.wall_idx])
+            else:
+                # The object processor already replaced the reference with the wall frame
+                walls.append(w.parent)
+        return walls
+
     def compute_3d_shape(self):
-        mm = get_metamodel(self)
-        if not textx_isinstance(self.shape, mm["Circle"]):
-            wall = self.location.walls[0].space.walls[self.location.walls[0].wall_idx]
-            thickness = wall.thickness.value
-            if len(self.location.walls) == 2:
-                wall_2 = self.location.walls[1].space.walls[
-                    self.location.walls[1].wall_idx
-                ]
-                thickness = thickness + wall_2.thickness.value
+        if not get_types(self).isinstance(self.shape, "Circle"):
+            walls = self.get_walls()
+            thickness = walls[0].thickness.value
+            if len(walls) == 2:
+                thickness = thickness + walls[1].thickness.value
             self.shape_3d = Polyhedron(self, self.shape, thickness=thickness)
             self.shape_position_coords = self.get_shape_point_positions(self.shape_3d)
@@ -1,17 +1,17 @@
 from textx.exceptions import TextXSemanticError, TextXSyntaxError
 from textx import (
-    textx_isinstance,
-    get_metamodel,
     get_model,
     get_location,
     metamodel_for_language,
 )
 
+from floorplan_dsl.utils.dispatch import get_types
+
 
 def validate_variable_reference_as_value(value, var_type="LengthVariable"):
-    mm = get_metamodel(value)
-    mm_var_type = mm[var_type]
-    if textx_isinstance(value, mm["VariableReference"]) and not textx_isinstance(
+    types = get_types(value)
+    mm_var_type = types[var_type]
+    if types.isinstance(value, "VariableReference") and not types.isinstance(
         value.variable, mm_var_type
     ):
         expected_unit = mm_var_type._tx_attrs.get("unit").cls._tx_peg_rule
@@ -77,19 +77,17 @@ def validate_element_location(element):
 
 
 def validate_space_location_flags(space):
-    mm = get_metamodel(space)
+    types = get_types(space)
     if (
         space.location.spaced
-        and textx_isinstance(space.location.wrt, mm["Frame"])
+        and types.isinstance(space.location.wrt, "Frame")
         and space.location.wrt.name == "world-frame"
     ):
         raise TextXSemanticError(
             "A space cannot be 'spaced' when defined wrt to the world frame",
             **get_location(space.location.wrt),
         )
-    elif space.location.spaced and textx_isinstance(
-        space.location.wrt, mm["WorldFrame"]
-    ):
+    elif space.location.spaced and types.isinstance(space.location.wrt, "WorldFrame"):
         raise TextXSemanticError(
             "A space cannot be 'spaced' when defined wrt to the world frame",
             **get_location(space.location.wrt),
@@ -127,8 +125,7 @@ def validate_size_is_non_zero_positive(metric):
 
 
 def validate_opening_shape(opening):
-    mm = get_metamodel(opening)
-    if textx_isinstance(opening.shape, mm["Rectangle"]):
+    if get_types(opening).isinstance(opening.shape, "Rectangle"):
         if opening.shape.length:
             raise TextXSyntaxError(
                 "Openings with rectangle shape must define height instead of length",
@@ -141,8 +138,8 @@ def validate_opening_shape(opening):
 
 def validate_element_shape(element):
     element_type = element.__class__.__name__
-    mm = get_metamodel(element)
-    if textx_isinstance(element.shape, mm["Rectangle"]):
+    types = get_types(element)
+    if types.isinstance(element.shape, "Rectangle"):
         if element.shape.height:
             raise TextXSyntaxError(
                 "{} with rectangle shape must define length instead of height".format(
@@ -152,7 +149,7 @@ def validate_element_shape(element):
             )
         validate_size_is_non_zero_positive(element.shape.width)
         validate_size_is_non_zero_positive(element.shape.length)
-    elif textx_isinstance(element.shape, mm["SimplePolygon"]):
+    elif types.isinstance(element.shape, "SimplePolygon"):
         for point in element.shape.coordinates:
             if transformation_in_direction(point.z):
                 raise TextXSyntaxError(
@@ -0,0 +1,198 @@
+"""
+Validation of the geometry of processed floor plan models
+
+The footprints of the spaces in the world frame are indexed in a shapely
+STRtree, so that the overlapping spaces and the spaces around each feature
+are found with tree queries instead of comparing every pair of elements.
+Features are checked against the outline of their space including its
+walls, and openings against the side of their walls.
+"""
+
+import numpy as np
+
+from shapely import Point, Polygon, STRtree, box, union_all
+from textx import get_location
+from textx.exceptions import TextXSemanticError
+
+from floorplan_dsl.utils.dispatch import get_types
+from floorplan_dsl.utils.frames import get_frame_tree
+from floorplan_dsl.utils.transformations import Transformation
+
+OVERLAPPING_SPACES = "overlapping-spaces"
+FEATURE_OUTSIDE_SPACE = "feature-outside-space"
+OPENING_OUTSIDE_WALL = "opening-outside-wall"
+
+
+class GeometryIssue:
+    """Elements of a floor plan whose geometry is not valid"""
+
+    def __init__(self, kind, elements, message, area=0.0) -> None:
+        self.kind = kind
+        self.elements = elements
+        self.message = message
+        self.area = area
+
+    def __str__(self) -> str:
+        return self.message
+
+    def __repr__(self) -> str:
+        return "GeometryIssue({}, {})".format(
+            self.kind, ", ".join(e.name for e in self.elements)
+        )
+
+
+def get_shape_polygon(shape, axes=(0, 1), tm=None):
+    """Return the shapely polygon of a shape, optionally transformed by a 4x4 matrix
+
+    Parameters
+    ----------
+    shape: Rectangle, SimplePolygon or Circle
+    axes: the two coordinates of the points used for the polygon
+    tm: optional transformation matrix applied to the points
+    """
+    if get_types(shape).isinstance(shape, "Circle"):
+        center = np.zeros(3) if tm is None else tm[:3, 3]
+        return Point(center[list(axes)]).buffer(shape.radius.value)
+
+    points = shape.coordinate_array
+    if tm is not None:
+        points = Transformation.transform_points(tm, points)
+    return Polygon(points[:, axes])
+
+
+def get_footprint(element, frame_tree):
+    """Return the polygon of a space or feature in the (x, y) plane of the world frame"""
+    tm = frame_tree.get_world_transformation(element.frame)
+    return get_shape_polygon(element.shape, tm=tm)
+
+
+def get_outline(space, frame_tree):
+    """Return the polygon of the outer corners of the walls of a space in the world frame"""
+    tm = frame_tree.get_world_transformation(space.frame)
+    corners = space._get_outer_wall_points()
+    points = np.column_stack((corners, np.zeros(len(corners))))
+    return Polygon(Transformation.transform_points(tm, points)[:, :2])
+
+
+def get_wall_openings(model):
+    """Return the pairs of openings and walls they are located in"""
+    pairs = list()
+    for opening in model.wall_openings:
+        for wall in opening.get_walls():
+            pairs.append((opening, wall))
+    return pairs
+
+
+def find_overlapping_spaces(spaces, footprints, index, tolerance):
+    issues = list()
+    candidates = index.query(footprints, predicate="intersects")
+    for i, j in candidates.T:
+        if i >= j:
+            continue
+        area = footprints[i].intersection(footprints[j]).area
+        if area > tolerance:
+            issues.append(
+                GeometryIssue(
+                    OVERLAPPING_SPACES,
+                    [spaces[i], spaces[j]],
+                    "Spaces {} and {} overlap by {:.3f} m2".format(
+                        spaces[i].name, spaces[j].name, area
+                    ),
+                    area,
+                )
+            )
+    return issues
+
+
+def find_features_outside_spaces(
+    model, spaces, footprints, index, frame_tree, tolerance
+):
+    issues = list()
+
+    # Features may be embedded in the walls of their space, e.g. columns
+    outlines = [get_outline(s, frame_tree) for s in spaces]
+    features = list()
+    for i, space in enumerate(spaces):
+        features.extend((f, outlines[i], space.name) for f in space.features)
+    polygons = [get_footprint(f, frame_tree) for f, _, _ in features]
+    for feature in model.features:
+        # Features of the floor plan may lie in any of the spaces around them
+        polygon = get_footprint(feature, frame_tree)
+        around = [outlines[i] for i in index.query(polygon, predicate="intersects")]
+        features.append((feature, union_all(around), "any space"))
+        polygons.append(polygon)
+
+    for (feature, outline, space_name), polygon in zip(features, polygons):
+        area = polygon.difference(outline).area
+        if area > tolerance:
+            issues.append(
+                GeometryIssue(
+                    FEATURE_OUTSIDE_SPACE,
+                    [feature],
+                    "Feature {} sticks out of {} by {:.3f} m2".format(
+                        feature.name, space_name, area
+                    ),
+                    area,
+                )
+            )
+    return issues
+
+
+def find_openings_outside_walls(model, frame_tree, tolerance):
+    issues = list()
+    for opening, wall in get_wall_openings(model):
+        # Compare the opening with the side of the wall, in the (x, z) plane of
+        # the wall frame. The wall spans from its inner to its outer corners
+        tm = frame_tree.transform(opening.frame, wall.frame)
+        polygon = get_shape_polygon(opening.shape, axes=(0, 2), tm=tm)
+        x = wall.shape.coordinate_array[:, 0]
+        face = box(x.min(), 0.0, x.max(), wall.height.value)
+
+        area = polygon.difference(face).area
+        if area > tolerance:
+            issues.append(
+                GeometryIssue(
+                    OPENING_OUTSIDE_WALL,
+                    [opening, wall],
+                    "Opening {} is not within wall {} by {:.3f} m2".format(
+                        opening.name, wall.name, area
+                    ),
+                    area,
+                )
+            )
+    return issues
+
+
+def find_geometry_issues(model, tolerance=1e-6):
+    """Return the geometry issues of a processed floor plan model
+
+    These are the spaces that overlap each other, the features that stick
+    out of their space (or of all the spaces for features of the floor plan)
+    and the openings that do not lie within the walls they are located in.
+    Overlaps up to ``tolerance`` square meters are ignored.
+    """
+    frame_tree = get_frame_tree(model)
+    spaces = list(model.spaces)
+    footprints = [get_footprint(s, frame_tree) for s in spaces]
+    index = STRtree(footprints)
+
+    issues = find_overlapping_spaces(spaces, footprints, index, tolerance)
+    issues.extend(
+        find_features_outside_spaces(
+            model, spaces, footprints, index, frame_tree, tolerance
+        )
+    )
+    issues.extend(find_openings_outside_walls(model, frame_tree, tolerance))
+    return issues
+
+
+def validate_floorplan_geometry(model, tolerance=1e-6):
+    """Raise a TextXSemanticError listing the geometry issues of a floor plan, if any"""
+    issues = find_geometry_issues(model, tolerance)
+    if issues:
+        raise TextXSemanticError(
+            "Invalid geometry in floor plan {}:\n{}".format(
+                model.name, "\n".join("  " + str(i) for i in issues)
+            ),
+            **get_location(issues[0].elements[0]),
+        )
@@ -9,7 +9,13 @@ import textx.scoping.providers as scoping_providers
 from textx import LanguageDesc, GeneratorDesc, metamodel_from_file
 
 from floorplan_dsl.generators.fpm import jsonld_floorplan_generator
-from floorplan_dsl.generators.variations import variation_floorplan_generator
+from floorplan_dsl.generators.occupancy import occupancy_grid_generator
+from floorplan_dsl.generators.esdf import esdf_generator
+from floorplan_dsl.generators.mesh import mesh_generator
+from floorplan_dsl.generators.variations import (
+    variation_floorplan_generator,
+    variation_jsonld_generator,
+)
 
 # Classes for FloorPlan DSL and Variation DSL
 from floorplan_dsl.classes.variation.distribution import (
@@ -18,6 +24,10 @@ from floorplan_dsl.classes.variation.distribution import (
     NormalDistribution,
 )
 
+from floorplan_dsl.classes.fpm2 import use_position_slots
+from floorplan_dsl.utils.cache import use_model_cache
+from floorplan_dsl.utils.index import index_model_processor
+
 import floorplan_dsl.classes.fpm2.floorplan as fpm
 import floorplan_dsl.classes.fpm2.geometry as geom
 import floorplan_dsl.classes.fpm2.qudt as qudt
@@ -65,6 +75,7 @@ def fpv2_metamodel():
             geom.Face,
         ],
     )
+    use_position_slots(floorplan_mm.user_classes.values())
     floorplan_mm.register_obj_processors(
         {
             "Space": proc2.space_processor,
@@ -81,9 +92,17 @@ def fpv2_metamodel():
         {
             "WallFrame.space": scope2.space_location_scope_provider,
             "SpaceFrame.space": scope2.space_location_scope_provider,
+            "VariableReference.variable": scope2.variable_scope_provider,
         }
     )
+    floorplan_mm.register_model_processor(index_model_processor)
+    floorplan_mm.register_model_processor(sem2.geometry_model_processor)
+    floorplan_mm.model_param_defs.add(
+        "eager_geometry",
+        "compute the shapes, points and polyhedra of the elements when the model is loaded",
+    )
     floorplan_mm.auto_init_attributes = False
+    use_model_cache(floorplan_mm, "fpm")
     return floorplan_mm
 
 
@@ -97,6 +116,7 @@ def variation_metamodel():
         {"DiscreteDistribution": discrete_distribution_obj_processor}
     )
     mm_variation.register_scope_providers({"*.*": scoping_providers.FQNImportURI()})
+    use_model_cache(mm_variation, "fpm-variation")
 
     return mm_variation
 
@@ -122,9 +142,37 @@ variation_floorplan_gen = GeneratorDesc(
     generator=variation_floorplan_generator,
 )
 
+variation_jsonld_gen = GeneratorDesc(
+    language="fpm-variation",
+    target="json-ld",
+    description="Generate json-ld models of variations of indoor environments in memory",
+    generator=variation_jsonld_generator,
+)
+
 json_ld_floorplan_gen = GeneratorDesc(
     language="fpm",
     target="json-ld",
     description="Generate composable models in json-ld",
     generator=jsonld_floorplan_generator,
 )
+
+occupancy_grid_floorplan_gen = GeneratorDesc(
+    language="fpm",
+    target="occupancy-grid",
+    description="Generate occupancy grid maps (PGM and YAML) of floor plans",
+    generator=occupancy_grid_generator,
+)
+
+esdf_floorplan_gen = GeneratorDesc(
+    language="fpm",
+    target="esdf",
+    description="Generate Euclidean signed distance fields (.npy) of floor plans",
+    generator=esdf_generator,
+)
+
+mesh_floorplan_gen = GeneratorDesc(
+    language="fpm",
+    target="mesh",
+    description="Generate triangle meshes (binary STL or glTF) of floor plans",
+    generator=mesh_generator,
+)
@@ -1,8 +1,11 @@
 from textx import get_model, textx_isinstance
-from textx.scoping.tools import get_unique_named_object
+from textx.exceptions import TextXSemanticError
+from textx.scoping.tools import get_parser
 
 
 from floorplan_dsl.classes.fpm2.floorplan import Feature
+from floorplan_dsl.utils.dispatch import get_types
+from floorplan_dsl.utils.index import get_model_index
 
 
 def space_location_scope_provider(frame, attr, attr_ref):
@@ -15,4 +18,28 @@ def space_location_scope_provider(frame, attr, attr_ref):
         else:
             return frame.parent.parent
     else:
-        return get_unique_named_object(m, name)
+        return get_model_index(m).get_unique(name)
+
+
+def variable_scope_provider(reference, attr, attr_ref):
+    """Resolve a variable reference with the name index of the model
+
+    Like the default scope provider of textX, the reference resolves to the
+    only object of the model with its name and of the class of the reference.
+    """
+    m = get_model(reference)
+    types = get_types(reference)
+    variables = [
+        v
+        for v in get_model_index(m).get_all(attr_ref.obj_name)
+        if types.isinstance(v, attr_ref.cls)
+    ]
+    if len(variables) > 1:
+        line, col = get_parser(reference).pos_to_linecol(attr_ref.position)
+        raise TextXSemanticError(
+            "name {} is not unique.".format(attr_ref.obj_name),
+            line=line,
+            col=col,
+            filename=m._tx_filename,
+        )
+    return variables[0] if variables else None
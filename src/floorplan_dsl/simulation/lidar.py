@@ -0,0 +1,242 @@
+"""
+Simulation of 2D laser scans in floor plans
+
+The rays are cast against the edges of the obstacles of a floor plan in the
+(x, y) plane of the world frame: its walls, without the passages of the
+entryways, and its columns and dividers. The edges are indexed in a uniform
+grid, and all the rays of a batch walk through the cells of the grid
+together. At each step, each ray is only intersected with the edges of
+its current cell, and stops at the first hit within that cell; rays in
+empty cells skip ahead through the empty space around them.
+"""
+
+import numpy as np
+
+from floorplan_dsl.generators.esdf import get_obstacles, get_segments
+
+
+def get_obstacle_segments(model, resolution=0.05):
+    """Return the (m, 4) array of the edges of the obstacles of a floor plan
+
+    Parameters
+    ----------
+    model: processed floor plan model
+    resolution: largest length of the edges of the polygons that approximate
+        circular features
+    """
+    obstacles, _ = get_obstacles(model, resolution)
+    return get_segments(obstacles)
+
+
+def cross(a, b):
+    """Return the z component of the cross product of (..., 2) vectors"""
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+class SegmentGrid:
+    """Uniform grid of line segments for ray casting
+
+    Each cell of the grid holds the indices of the segments that cross it,
+    in a (cells, k) table padded with -1, where k is the largest number of
+    segments in a cell, and the start and direction of these segments in a
+    (cells, k, 4) table. Empty cells also hold the distance that a ray can
+    travel from any of their points without reaching a cell with segments,
+    so that rays skip the empty space in a few steps.
+    """
+
+    def __init__(self, segments, cell_size=0.5, max_skip=32) -> None:
+        self.segments = np.asarray(segments, dtype=float).reshape(-1, 4)
+        self.cell_size = cell_size
+
+        points = self.segments.reshape(-1, 2)
+        if len(points) == 0:
+            points = np.zeros((1, 2))
+        self.origin = points.min(axis=0) - cell_size
+        self.shape = (
+            np.ceil((points.max(axis=0) + cell_size - self.origin) / cell_size)
+        ).astype(int)
+        self.cells, counts = self._build()
+        self.skip = self._get_skip_distances(counts > 0, max_skip)
+
+        # Start and direction of the segments of each cell, NaN for padding
+        start = self.segments[:, :2]
+        lines = np.hstack((start, self.segments[:, 2:] - start))
+        self.cell_lines = np.where(
+            self.cells[..., None] >= 0, lines[self.cells], np.nan
+        )
+
+    @classmethod
+    def from_model(cls, model, cell_size=0.5, resolution=0.05):
+        """Return the grid of the edges of the obstacles of a processed floor plan model"""
+        return cls(get_obstacle_segments(model, resolution), cell_size)
+
+    def _build(self):
+        """Return the padded table of the segments of each cell, and their number"""
+        a, b = self.segments[:, :2], self.segments[:, 2:]
+        lo = np.floor((np.minimum(a, b) - self.origin) / self.cell_size).astype(int)
+        hi = np.floor((np.maximum(a, b) - self.origin) / self.cell_size).astype(int)
+
+        # All the cells in the bounds of each segment
+        counts = np.prod(hi - lo + 1, axis=1)
+        seg = np.repeat(np.arange(len(self.segments)), counts)
+        offsets = np.arange(len(seg)) - np.repeat(np.cumsum(counts) - counts, counts)
+        width = (hi - lo + 1)[seg, 0]
+        ix = lo[seg, 0] + offsets % width
+        iy = lo[seg, 1] + offsets // width
+
+        # Only the cells crossed by the line of the segment
+        half = self.cell_size / 2
+        center = self.origin + (np.column_stack((ix, iy)) + 0.5) * self.cell_size
+        e = (b - a)[seg]
+        distance = np.abs(cross(e, center - a[seg]))
+        extent = half * (np.abs(e[:, 0]) + np.abs(e[:, 1]))
+        crossed = distance <= extent * (1 + 1e-9)
+        seg, cell = seg[crossed], (ix * self.shape[1] + iy)[crossed]
+
+        order = np.argsort(cell, kind="stable")
+        seg, cell = seg[order], cell[order]
+        n_cells = self.shape[0] * self.shape[1]
+        per_cell = np.bincount(cell, minlength=n_cells)
+        table = np.full((n_cells, max(per_cell.max(initial=0), 1)), -1, dtype=int)
+        rank = np.arange(len(cell)) - np.repeat(
+            np.cumsum(per_cell) - per_cell, per_cell
+        )
+        table[cell, rank] = seg
+        return table, per_cell
+
+    def _get_skip_distances(self, occupied, max_skip):
+        """Return the distance a ray can safely travel from each cell
+
+        A cell at a chessboard distance ``n`` from the closest cell with
+        segments can be left for ``n - 1`` cell sizes in any direction. The
+        distances are found by dilating the occupied cells up to
+        ``max_skip`` times.
+        """
+        occupied = occupied.reshape(self.shape)
+        distance = np.where(occupied, 0, max_skip)
+        reached = occupied.copy()
+        for n in range(1, max_skip):
+            padded = np.pad(reached, 1)
+            dilated = np.zeros_like(reached)
+            for dx in range(3):
+                for dy in range(3):
+                    dilated |= padded[dx : dx + self.shape[0], dy : dy + self.shape[1]]
+            distance[dilated & ~reached] = n
+            if dilated.all():
+                break
+            reached = dilated
+        return (np.maximum(distance - 1, 0) * self.cell_size).ravel()
+
+    def cast(self, origins, directions, max_range=np.inf):
+        """Return the distance along each ray to the first segment it hits
+
+        Parameters
+        ----------
+        origins: (n, 2) array of the origins of the rays
+        directions: (n, 2) array of the unit directions of the rays
+        max_range: largest distance to look for a hit
+
+        Returns
+        -------
+        (n,) array of distances, ``inf`` for the rays that hit no segment
+        within ``max_range``
+        """
+        origins = np.asarray(origins, dtype=float)
+        directions = np.asarray(directions, dtype=float)
+        ranges = np.full(len(origins), np.inf)
+        if len(self.segments) == 0:
+            return ranges
+
+        h = self.cell_size
+        lower = self.origin
+        upper = self.origin + self.shape * h
+        # Rays parallel to an axis never cross the boundaries along it
+        directions = np.where(directions == 0, 1e-300, directions)
+        with np.errstate(over="ignore"):
+            inverse = 1.0 / directions
+
+        # Entry and exit of the rays in the bounds of the grid
+        t0 = (lower - origins) * inverse
+        t1 = (upper - origins) * inverse
+        t = np.maximum(np.minimum(t0, t1).max(axis=1), 0.0)
+        t_exit = np.minimum(np.maximum(t0, t1).min(axis=1), max_range)
+
+        active = np.flatnonzero(t <= t_exit)
+        o, d, inv = origins[active], directions[active], inverse[active]
+        t, t_exit = t[active], t_exit[active]
+        # Offset of the far boundary of a cell along each axis
+        far = lower + (d > 0) * h
+
+        while len(active):
+            cell = np.floor((o + t[:, None] * d - lower) / h).astype(int)
+            cell = np.clip(cell, 0, self.shape - 1)
+            cid = cell[:, 0] * self.shape[1] + cell[:, 1]
+
+            # Distance along the ray to the exit of its current cell
+            with np.errstate(over="ignore"):
+                t_cell = ((far + cell * h - o) * inv).min(axis=1)
+
+            # Intersections with the segments of the current cell, for the
+            # rays in a cell with segments
+            found = np.zeros(len(active), dtype=bool)
+            busy = np.flatnonzero(self.skip[cid] == 0)
+            if len(busy):
+                lines = self.cell_lines[cid[busy]]
+                ao = lines[..., :2] - o[busy, None]
+                e = lines[..., 2:]
+                db = d[busy, None]
+                denominator = cross(db, e)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    ti = cross(ao, e) / denominator
+                    u = cross(ao, db) / denominator
+                limit = np.minimum(t_cell[busy], t_exit[busy])[:, None] + 1e-9
+                hit = (ti > 1e-9) & (ti <= limit) & (u >= 0) & (u <= 1)
+                ti = np.where(hit, ti, np.inf).min(axis=1)
+
+                hits = np.isfinite(ti)
+                ranges[active[busy[hits]]] = ti[hits]
+                found[busy[hits]] = True
+
+            # Move the other rays past their cell, or further in empty space
+            t = np.maximum(t_cell, t + self.skip[cid]) + 1e-9 * h
+            keep = ~found & (t <= t_exit)
+            active, o, d, inv = active[keep], o[keep], d[keep], inv[keep]
+            t, t_exit, far = t[keep], t_exit[keep], far[keep]
+
+        return ranges
+
+
+def get_scan_angles(beams, fov=2 * np.pi):
+    """Return the angles of the beams of a scan, centered on the x axis of the scanner"""
+    if fov >= 2 * np.pi:
+        return np.linspace(-np.pi, np.pi, beams, endpoint=False)
+    return np.linspace(-fov / 2, fov / 2, beams)
+
+
+def simulate_scans(grid, poses, angles, max_range=np.inf, batch_size=2**16):
+    """Return the ranges of laser scans taken at poses in a floor plan
+
+    Parameters
+    ----------
+    grid: SegmentGrid of the obstacles of the floor plan
+    poses: (p, 3) array of the x, y and yaw of the scanner in the world frame
+    angles: (b,) array of the angles of the beams wrt the scanner
+    max_range: range of the scanner
+    batch_size: largest number of rays cast at once
+
+    Returns
+    -------
+    (p, b) array of ranges, ``inf`` for the beams without a return
+    """
+    poses = np.asarray(poses, dtype=float).reshape(-1, 3)
+    angles = np.asarray(angles, dtype=float)
+    yaw = (poses[:, 2, None] + angles).ravel()
+    directions = np.column_stack((np.cos(yaw), np.sin(yaw)))
+    origins = np.repeat(poses[:, :2], len(angles), axis=0)
+
+    ranges = np.empty(len(origins))
+    for i in range(0, len(origins), batch_size):
+        ranges[i : i + batch_size] = grid.cast(
+            origins[i : i + batch_size], directions[i : i + batch_size], max_range
+        )
+    return ranges.reshape(len(poses), len(angles))
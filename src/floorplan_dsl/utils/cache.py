@@ -0,0 +1,439 @@
+import bisect
+import functools
+import glob
+import hashlib
+import importlib.metadata
+import io
+import json
+import os
+import pickle
+import sys
+import tempfile
+import weakref
+
+from functools import lru_cache
+
+from arpeggio import Parser
+from textx import metamodel_for_language
+from textx.metamodel import TextXMetaModel
+from textx.scoping import GlobalModelRepository
+
+from floorplan_dsl.utils.params import get_bool_param
+
+PACKAGE_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Parts of the package that change the loaded models: the grammars, the
+# classes, the object and model processors and the scope providers
+MODEL_SOURCES = [
+    "grammar",
+    "classes",
+    "processors",
+    "scoping",
+    "utils",
+    "registration.py",
+]
+
+# Default size of the model cache, in bytes
+DEFAULT_CACHE_SIZE = 1 << 30
+
+# Environment variables of the model cache used by ``model_from_file``
+CACHE_DIR_VARIABLE = "FLOORPLAN_MODEL_CACHE"
+CACHE_SIZE_VARIABLE = "FLOORPLAN_MODEL_CACHE_SIZE"
+
+# Suffix of the entries of the model cache
+ENTRY_SUFFIX = ".pickle"
+
+
+class CacheStats:
+    """Hit and miss counters of a cache"""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
+
+    @property
+    def miss_rate(self):
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.misses / total
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self) -> str:
+        return "CacheStats(hits={}, misses={}, hit_rate={:.2f})".format(
+            self.hits, self.misses, self.hit_rate
+        )
+
+
+def get_file_digest(path):
+    """Return the SHA-256 digest of the content of a file"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def get_version(distribution):
+    try:
+        return importlib.metadata.version(distribution)
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+@lru_cache(maxsize=None)
+def get_sources_digest():
+    """Return the digest of the sources that the loaded models depend on
+
+    The ``MODEL_SOURCES`` of the package are hashed with the versions of
+    Python, textX, Arpeggio and the package, so that the models of an
+    editable install are loaded again after any of them changed. The
+    generators and templates do not change the loaded models and are left
+    out.
+    """
+    versions = [sys.version.split()[0]]
+    versions.extend(get_version(d) for d in ("floorplan-dsl", "textX", "Arpeggio"))
+    h = hashlib.sha256(" ".join(versions).encode("utf-8"))
+    for source in MODEL_SOURCES:
+        path = os.path.join(PACKAGE_FOLDER, source)
+        paths = [path] if os.path.isfile(path) else list()
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            paths.extend(os.path.join(root, name) for name in sorted(files))
+        for path in paths:
+            h.update(os.path.relpath(path, PACKAGE_FOLDER).encode("utf-8"))
+            h.update(get_file_digest(path).encode("ascii"))
+    return h.hexdigest()
+
+
+def get_model_dependencies(model):
+    """Return the paths of the file of a model and of all the models it imports"""
+    paths = list()
+    models = [model]
+    while models:
+        m = models.pop()
+        if m._tx_filename is None or m._tx_filename in paths:
+            continue
+        paths.append(m._tx_filename)
+        repository = getattr(m, "_tx_model_repository", None)
+        if repository is not None:
+            models.extend(repository.local_models.filename_to_model.values())
+    return paths
+
+
+# Languages of the metamodels whose models are cached, to find the
+# metamodels and the classes of the grammar rules of an entry again
+_metamodel_languages = weakref.WeakKeyDictionary()
+
+
+def _get_metamodel(language):
+    return metamodel_for_language(language)
+
+
+def _get_rule_class(language, fqn):
+    return metamodel_for_language(language)[fqn]
+
+
+def _get_model_repository(models):
+    repository = GlobalModelRepository()
+    for model in models:
+        repository.local_models.add_model(model)
+    return repository
+
+
+class ModelSource:
+    """Stand-in for the parser of a cached model
+
+    textX keeps the parser of a model to find the line and column of its
+    objects, e.g. in the messages of ``TextXSemanticError``. The file of the
+    model is only read when a position is looked up.
+    """
+
+    def __init__(self, file_name, encoding="utf-8") -> None:
+        self.file_name = file_name
+        self.encoding = encoding
+        self._line_ends = None
+
+    def pos_to_linecol(self, pos):
+        """Return the line and column of a position, as ``arpeggio.Parser`` does"""
+        if self._line_ends is None:
+            with open(self.file_name, encoding=self.encoding, newline="") as f:
+                text = f.read()
+            self._line_ends = [i for i, c in enumerate(text) if c == "\n"]
+        line = bisect.bisect_left(self._line_ends, pos)
+        col = pos
+        if line > 0:
+            col -= self._line_ends[line - 1] + 1
+        return line + 1, col + 1
+
+    def __reduce__(self):
+        return ModelSource, (self.file_name, self.encoding)
+
+
+class ModelPickler(pickle.Pickler):
+    """Pickler of the models of the languages of ``_metamodel_languages``
+
+    textX creates the classes of the grammar rules and the metamodels at
+    runtime, so they are pickled by their language and name and found again
+    with ``metamodel_for_language``. The parsers are replaced by a
+    :class:`ModelSource` and the repositories by the models they hold.
+    """
+
+    def __init__(self, file, encoding="utf-8") -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.encoding = encoding
+
+    def reducer_override(self, obj):
+        if isinstance(obj, type):
+            metamodel = vars(obj).get("_tx_metamodel")
+            if metamodel is not None and "<locals>" in obj.__qualname__:
+                return _get_rule_class, (self.get_language(metamodel), obj._tx_fqn)
+            return NotImplemented
+        if isinstance(obj, TextXMetaModel):
+            return _get_metamodel, (self.get_language(obj),)
+        if isinstance(obj, Parser):
+            return ModelSource, (obj.file_name, self.encoding)
+        if isinstance(obj, GlobalModelRepository):
+            models = list(obj.local_models.filename_to_model.values())
+            return _get_model_repository, (models,)
+        return NotImplemented
+
+    def get_language(self, metamodel):
+        language = _metamodel_languages.get(metamodel)
+        if language is None or metamodel is not metamodel_for_language(language):
+            raise pickle.PicklingError(
+                "The metamodel of the model is not a registered language"
+            )
+        return language
+
+
+class ModelCache:
+    """Cache on disk of the loaded models
+
+    Each entry is a pickle of the digests of the files of a model and of the
+    models it imports, followed by the pickle of the loaded model. Entries
+    are found by a key made of the digests of the model file and of the
+    sources of the package (see :func:`get_sources_digest`), the language,
+    the object processors of the metamodel and the model parameters. As the
+    imports of a model are only known once it is parsed, their digests are
+    checked when an entry is found.
+
+    The entries are written atomically, so that several processes can share
+    a cache, and the least recently used ones are evicted after each new
+    entry until the cache fits in ``max_size`` bytes. Loading an entry runs
+    ``pickle``, so the cache folder must not be writable by anyone else.
+    """
+
+    def __init__(self, path, max_size=DEFAULT_CACHE_SIZE) -> None:
+        self.path = path
+        self.max_size = max_size
+        self.stats = CacheStats()
+
+    def get_key(self, model_path, language, metamodel, params):
+        """Return the key of a model file loaded by a metamodel with model parameters"""
+        description = json.dumps(
+            {
+                "sources": get_sources_digest(),
+                "model": get_file_digest(model_path),
+                "language": language,
+                "processors": {
+                    name: getattr(processor, "__qualname__", repr(processor))
+                    for name, processor in metamodel._obj_processors.items()
+                },
+                "params": params,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+    def get_entry_path(self, key):
+        return os.path.join(self.path, key[:2], key + ENTRY_SUFFIX)
+
+    def load(self, key, model_path):
+        """Return the cached model of a key
+
+        Returns
+        -------
+        The model, or None if the key is not in the cache or the files of
+        the imported models changed
+        """
+        entry_path = self.get_entry_path(key)
+        try:
+            with open(entry_path, "rb") as f:
+                info = pickle.load(f)
+                model_folder = os.path.dirname(os.path.abspath(model_path))
+                for path, digest in info["dependencies"].items():
+                    path = os.path.join(model_folder, path)
+                    if not os.path.isfile(path) or get_file_digest(path) != digest:
+                        self.stats.misses += 1
+                        return None
+                model = pickle.load(f)
+        except Exception:
+            # Missing entries, but also entries truncated by a full disk or
+            # written with another version of a dependency, are loaded again
+            self.stats.misses += 1
+            return None
+
+        # The modification time of the entries orders them for eviction
+        os.utime(entry_path)
+        self.stats.hits += 1
+        return model
+
+    def store(self, key, model, encoding="utf-8"):
+        """Store a loaded model and evict the least recently used entries
+
+        Returns
+        -------
+        Whether the model was stored, it is not if it cannot be pickled or
+        written to the cache folder
+        """
+        model_folder = os.path.dirname(model._tx_filename)
+        info = {
+            "dependencies": {
+                os.path.relpath(path, model_folder): get_file_digest(path)
+                for path in get_model_dependencies(model)
+            }
+        }
+        data = io.BytesIO()
+        try:
+            pickle.dump(info, data, protocol=pickle.HIGHEST_PROTOCOL)
+            ModelPickler(data, encoding).dump(model)
+        except (pickle.PicklingError, RecursionError):
+            return False
+
+        entry_path = self.get_entry_path(key)
+        try:
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(entry_path), suffix=".tmp"
+            )
+        except OSError:
+            return False
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data.getbuffer())
+            os.replace(tmp_path, entry_path)
+        except BaseException as e:
+            os.remove(tmp_path)
+            if isinstance(e, OSError):
+                return False
+            raise
+
+        self.evict()
+        return True
+
+    def get_entries(self):
+        """Return the path, size and modification time of each entry, oldest first"""
+        entries = list()
+        for path in glob.glob(os.path.join(self.path, "*", "*" + ENTRY_SUFFIX)):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, path, st.st_size))
+        return [(path, size, mtime) for mtime, path, size in sorted(entries)]
+
+    def get_size(self):
+        """Return the bytes of all the entries of the cache"""
+        return sum(size for _, size, _ in self.get_entries())
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in its size
+
+        Returns
+        -------
+        The number of removed entries
+        """
+        entries = self.get_entries()
+        size = sum(s for _, s, _ in entries)
+        removed = 0
+        for path, entry_size, _ in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            removed += 1
+        return removed
+
+
+# Model cache set with set_model_cache, or None to use the default one
+_model_cache = None
+_model_cache_set = False
+
+
+@lru_cache(maxsize=None)
+def get_default_model_cache(path, size):
+    return ModelCache(path, DEFAULT_CACHE_SIZE if not size else int(size) << 20)
+
+
+def get_model_cache():
+    """Return the cache of the loaded models, or None if models are not cached
+
+    Unless a cache is set with :func:`set_model_cache`, the models are
+    cached in the folder of the ``FLOORPLAN_MODEL_CACHE`` environment
+    variable, with a size in MiB given by ``FLOORPLAN_MODEL_CACHE_SIZE``.
+    """
+    if _model_cache_set:
+        return _model_cache
+    path = os.environ.get(CACHE_DIR_VARIABLE)
+    if not path:
+        return None
+    return get_default_model_cache(path, os.environ.get(CACHE_SIZE_VARIABLE))
+
+
+def set_model_cache(cache):
+    """Set the cache of the loaded models of this process, None to disable it"""
+    global _model_cache, _model_cache_set
+    _model_cache = cache
+    _model_cache_set = True
+
+
+def use_model_cache(metamodel, language):
+    """Load the models of a metamodel through the model cache
+
+    ``model_from_file`` of the metamodel looks the model up in the cache of
+    :func:`get_model_cache` and stores it there after loading it. Models
+    are only cached for the metamodel registered for the language, and the
+    ``no_cache`` model parameter loads a model without the cache.
+    """
+    _metamodel_languages[metamodel] = language
+    metamodel.model_param_defs.add(
+        "no_cache", "load the model without reading or writing the model cache"
+    )
+    load = metamodel.model_from_file
+
+    @functools.wraps(load)
+    def model_from_file(file_name, encoding="utf-8", debug=None, **kwargs):
+        cache = get_model_cache()
+        if (
+            cache is None
+            or debug
+            or get_bool_param(kwargs, "no_cache")
+            or metamodel is not metamodel_for_language(language)
+        ):
+            return load(file_name, encoding, debug, **kwargs)
+
+        params = {k: v for k, v in kwargs.items() if k != "no_cache"}
+        params["encoding"] = encoding
+        key = cache.get_key(file_name, language, metamodel, params)
+        model = cache.load(key, file_name)
+        if model is None:
+            model = load(file_name, encoding, debug, **kwargs)
+            cache.store(key, model, encoding)
+        return model
+
+    metamodel.model_from_file = model_from_file
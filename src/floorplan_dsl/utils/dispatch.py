@@ -0,0 +1,76 @@
+import weakref
+
+from textx import get_metamodel, textx_isinstance
+
+_metamodel_types = weakref.WeakKeyDictionary()
+
+
+def get_metamodel_types(metamodel):
+    """Return the type cache of a metamodel, created on its first use"""
+    types = _metamodel_types.get(metamodel)
+    if types is None:
+        types = MetamodelTypes(metamodel)
+        _metamodel_types[metamodel] = types
+    return types
+
+
+def get_types(obj):
+    """Return the type cache of the metamodel of a model object"""
+    return get_metamodel_types(get_metamodel(obj))
+
+
+class MetamodelTypes:
+    """Cache of the classes of a metamodel and of the type checks against them
+
+    Whether an object is an instance of a textX class only depends on the
+    concrete class of the object, so :func:`textx.textx_isinstance` and its
+    walk through the classes that inherit from the textX class is done once
+    for each pair of classes. The handlers of the dispatch tables are found
+    the same way, once for each concrete class.
+    """
+
+    def __init__(self, metamodel) -> None:
+        self.metamodel = metamodel
+        self._classes = dict()
+        self._instances = dict()
+        self._handlers = dict()
+
+    def __getitem__(self, name):
+        cls = self._classes.get(name)
+        if cls is None:
+            cls = self.metamodel[name]
+            self._classes[name] = cls
+        return cls
+
+    def isinstance(self, obj, cls):
+        """Return whether an object is an instance of a textX class or class name"""
+        if isinstance(cls, str):
+            cls = self[cls]
+        key = (type(obj), cls)
+        result = self._instances.get(key)
+        if result is None:
+            result = textx_isinstance(obj, cls)
+            self._instances[key] = result
+        return result
+
+    def get_handler(self, obj, handlers):
+        """Return the handler of the first class of a dispatch table an object is an instance of
+
+        Parameters
+        ----------
+        obj: model object
+        handlers: tuple of (class name, handler) pairs, in order of priority
+
+        Returns
+        -------
+        The handler, or None if the object is an instance of none of the classes
+        """
+        key = (type(obj), handlers)
+        try:
+            return self._handlers[key]
+        except KeyError:
+            handler = next(
+                (h for name, h in handlers if self.isinstance(obj, name)), None
+            )
+            self._handlers[key] = handler
+            return handler
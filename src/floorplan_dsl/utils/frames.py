@@ -0,0 +1,222 @@
+import numpy as np
+
+from textx import get_location
+from textx.exceptions import TextXSemanticError
+
+from floorplan_dsl.utils.dispatch import get_types
+from floorplan_dsl.utils.transformations import Transformation
+
+
+def get_frame_tree(model):
+    """Return the frame tree of a processed floor plan model
+
+    The tree is built on the first call and kept in the model until
+    :func:`update_floorplan_semantics` recomputes the poses of the model.
+    """
+    tree = getattr(model, "frame_tree", None)
+    if tree is None:
+        tree = FrameTree(model)
+        model.frame_tree = tree
+    return tree
+
+
+def get_pose_coordinates(model):
+    """Return all the pose coordinates of a processed floor plan model
+
+    These are the poses of the wall frames wrt their space, followed by the
+    poses of the spaces, of the features and of the wall openings given by
+    their locations.
+    """
+    poses = list()
+    for space in model.spaces:
+        poses.extend(space.wall_pose_coords)
+    for space in model.spaces:
+        poses.append(space.pose)
+        poses.extend(feature.pose for feature in space.features)
+    poses.extend(feature.pose for feature in model.features)
+    poses.extend(opening.pose for opening in model.wall_openings)
+    return poses
+
+
+class FrameTree:
+    """Tree of the frames of a floor plan model, rooted at the world frame
+
+    Each pose coordinate of the model relates two frames. The tree is built
+    from the world frame outwards, so that a frame used as the ``wrt`` of a
+    pose may also be a child of its ``of`` frame (e.g. a space located by one
+    of its walls). The transformation of each frame wrt the world is computed
+    once, in topological order, and the transformations between frames are
+    cached on their first query.
+
+    Frames that are not connected to the world frame are rooted at the first
+    of their frames instead, and can only be related to the frames of their
+    own subtree.
+    """
+
+    def __init__(self, model) -> None:
+        self.model = model
+        self.world = model.frame
+
+        self._parents = dict()
+        self._roots = dict()
+        self._world_transformations = dict()
+        self._transformations = dict()
+
+        self.frames = list()
+        self._build(get_pose_coordinates(model))
+
+    @staticmethod
+    def _get_frame(reference):
+        if get_types(reference).isinstance(reference, "ReferenceFrame"):
+            return reference.frame
+        return reference
+
+    def _build(self, poses):
+        # Neighbours of each frame, with the index of their pose and whether
+        # the pose is walked from its of frame to its wrt frame
+        adjacency = dict()
+        # Component of each frame, to find the poses that close a cycle
+        components = dict()
+
+        def find(frame):
+            while components.setdefault(frame, frame) is not frame:
+                components[frame] = components[components[frame]]
+                frame = components[frame]
+            return frame
+
+        for i, pose in enumerate(poses):
+            of = self._get_frame(pose.of)
+            wrt = self._get_frame(pose.wrt)
+
+            root_of, root_wrt = find(of), find(wrt)
+            if root_of is root_wrt:
+                raise TextXSemanticError(
+                    "The pose of {} wrt {} closes a cycle of frames".format(
+                        of.name, wrt.name
+                    ),
+                    **get_location(pose.parent),
+                )
+            components[root_of] = root_wrt
+
+            adjacency.setdefault(wrt, list()).append((of, i, False))
+            adjacency.setdefault(of, list()).append((wrt, i, True))
+
+        # Transformation matrices of all the poses and of their inverses
+        edges = Transformation.get_transformation_matrices_from_models(poses)
+        inverses = Transformation.get_inverse(edges)
+
+        # Orient the tree from the world frame, then from the remaining roots
+        roots = list()
+        if self.world is not None:
+            roots.append(self.world)
+        roots.extend(adjacency)
+
+        for root in roots:
+            if root in self._roots:
+                continue
+            levels = self._add_subtree(root, adjacency)
+            self._set_world_transformations(levels, edges, inverses)
+
+    def _add_subtree(self, root, adjacency):
+        """Add the frames connected to a root breadth first and return them by level"""
+        self._parents[root] = None
+        self._roots[root] = root
+        self._world_transformations[root] = self._read_only(np.eye(4))
+        self.frames.append(root)
+
+        levels = list()
+        level = [root]
+        while level:
+            children = list()
+            for parent in level:
+                for child, i, reverse in adjacency.get(parent, []):
+                    if child in self._parents:
+                        continue
+                    self._parents[child] = parent
+                    self._roots[child] = root
+                    self.frames.append(child)
+                    children.append((child, parent, i, reverse))
+            if children:
+                levels.append(children)
+            level = [child for child, _, _, _ in children]
+        return levels
+
+    def _set_world_transformations(self, levels, edges, inverses):
+        """Compose the transformations wrt the world of the frames of each level at once"""
+        for level in levels:
+            parents = np.array([self._world_transformations[p] for _, p, _, _ in level])
+            idx = np.array([i for _, _, i, _ in level])
+            reverse = np.array([r for _, _, _, r in level])
+            tms = np.where(reverse[:, None, None], inverses[idx], edges[idx])
+
+            world = self._read_only(Transformation.compose(parents, tms))
+            for (child, _, _, _), tm in zip(level, world):
+                self._world_transformations[child] = tm
+
+    @staticmethod
+    def _read_only(tm):
+        tm.flags.writeable = False
+        return tm
+
+    def __contains__(self, frame):
+        return frame in self._parents
+
+    def __len__(self):
+        return len(self.frames)
+
+    def _check_frame(self, frame):
+        if frame not in self._parents:
+            raise KeyError("Frame {} is not in the frame tree".format(frame.name))
+
+    def get_parent(self, frame):
+        """Return the parent of a frame in the tree, ``None`` for a root"""
+        self._check_frame(frame)
+        return self._parents[frame]
+
+    def get_root(self, frame):
+        """Return the root of the subtree of a frame, the world frame if connected to it"""
+        self._check_frame(frame)
+        return self._roots[frame]
+
+    def get_world_transformation(self, frame):
+        """Return the (read-only) transformation matrix of a frame wrt the world frame"""
+        self._check_frame(frame)
+        if self._roots[frame] is not self.world:
+            raise TextXSemanticError(
+                "Frame {} is not connected to the world frame".format(frame.name)
+            )
+        return self._world_transformations[frame]
+
+    def get_world_transformations(self, frames):
+        """Return the (n, 4, 4) stack of the transformation matrices of frames wrt the world frame"""
+        return np.array([self.get_world_transformation(f) for f in frames])
+
+    def transform(self, of, wrt):
+        """Return the (read-only) transformation matrix of frame ``of`` wrt frame ``wrt``
+
+        The matrix transforms the coordinates of a point wrt ``of`` to its
+        coordinates wrt ``wrt``.
+        """
+        tm = self._transformations.get((of, wrt))
+        if tm is not None:
+            return tm
+
+        self._check_frame(of)
+        self._check_frame(wrt)
+        if self._roots[of] is not self._roots[wrt]:
+            raise TextXSemanticError(
+                "Frames {} and {} are not connected".format(of.name, wrt.name)
+            )
+
+        tm = self._read_only(
+            Transformation.compose(
+                Transformation.get_inverse(self._world_transformations[wrt]),
+                self._world_transformations[of],
+            )
+        )
+        self._transformations[(of, wrt)] = tm
+        return tm
+
+    def transform_points(self, points, of, wrt):
+        """Transform (n, 3) points from their coordinates wrt ``of`` to ``wrt``"""
+        return Transformation.transform_points(self.transform(of, wrt), points)
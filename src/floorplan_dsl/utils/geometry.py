@@ -14,6 +14,39 @@ def get_intersection(a1, a2, b1, b2):
     return x / z, y / z
 
 
+def get_intersections(a1, a2, b1, b2):
+    """Batched version of :func:`get_intersection`
+
+    Parameters
+    ----------
+    a1, a2: (n, 2) arrays with two points of each line a
+    b1, b2: (n, 2) arrays with two points of each line b
+
+    Returns
+    -------
+    (n, 2) array with the intersection of each pair of lines a and b, or inf if they are parallel
+    """
+    la = get_homogeneous_lines(a1, a2)
+    lb = get_homogeneous_lines(b1, b2)
+    return get_line_intersections(la, lb)
+
+
+def get_homogeneous_lines(p1, p2):
+    """Return the (n, 3) homogeneous coordinates of the lines through each pair of points of p1 and p2"""
+    ones = np.ones((len(p1), 1))
+    return np.cross(np.hstack((p1, ones)), np.hstack((p2, ones)))
+
+
+def get_line_intersections(l1, l2):
+    """Return the (n, 2) intersections of two arrays of homogeneous lines, or inf for parallel lines"""
+    h = np.cross(l1, l2)
+    z = h[:, 2:]
+    parallel = z == 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        points = h[:, :2] / z
+    return np.where(parallel, float("inf"), points)
+
+
 def get_angle_between_vectors(v1, v2):
     # Adapted from https://stackoverflow.com/a/13849249
     u1 = _get_unit_vector(v1)
@@ -25,6 +58,15 @@ def get_angle_between_vectors(v1, v2):
     return sign * np.arccos(np.dot(u1, u2))
 
 
+def get_angles_wrt_x_axis(vectors):
+    """Batched version of :func:`get_angle_between_vectors` between each row of a (n, 2) array and the x-axis"""
+    vectors = np.asarray(vectors, dtype=float)
+    norms = np.sqrt(vectors[:, 0] * vectors[:, 0] + vectors[:, 1] * vectors[:, 1])
+    u = vectors / norms[:, np.newaxis]
+    sign = np.where(u[:, 1] < 0, -1, 1)
+    return sign * np.arccos(u[:, 0])
+
+
 def _get_unit_vector(vector):
     # Inputs need to be transformed to unit vectors so we can use np.arccos
     return vector / np.linalg.norm(vector)
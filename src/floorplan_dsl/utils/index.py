@@ -0,0 +1,133 @@
+import heapq
+
+from textx.const import MULT_ONE, MULT_OPTIONAL
+from textx.exceptions import TextXSemanticError
+
+from floorplan_dsl.classes.fpm2 import is_pending
+
+
+def get_model_index(model):
+    """Return the name index of a model
+
+    The index is built on the first call and kept in the model until
+    :func:`invalidate_model_index` is called after a change of the
+    structure of the model, e.g. once the object processors have added the
+    walls and frames of the model, when the derived geometry of an element
+    is computed on its first access, or when :func:`update_floorplan_semantics`
+    recomputes it.
+    """
+    index = getattr(model, "name_index", None)
+    if index is None:
+        index = ModelIndex(model)
+        model.name_index = index
+    return index
+
+
+def invalidate_model_index(model):
+    """Drop the name index of a model, to be built again on its next use"""
+    model.name_index = None
+
+
+def index_model_processor(model, metamodel):
+    """Drop the index used to resolve the references while the model was loaded"""
+    invalidate_model_index(model)
+
+
+def get_contained_objects(model):
+    """Return the objects contained in a model, in the order of ``textx.get_children``
+
+    Unlike ``textx.get_children``, the derived attributes of the floor plan
+    elements that have not been computed yet are not followed, so that
+    walking the model does not compute them.
+    """
+    objects = list()
+    visited = set()
+
+    def follow(obj):
+        cls = obj.__class__
+        if id(obj) in visited or not hasattr(cls, "_tx_attrs"):
+            return
+        objects.append(obj)
+        visited.add(id(obj))
+        for name, attr in cls._tx_attrs.items():
+            if not attr.cont or is_pending(obj, name):
+                continue
+            value = getattr(obj, name)
+            if attr.mult in (MULT_ONE, MULT_OPTIONAL):
+                if value is not None:
+                    follow(value)
+            elif value:
+                for v in value:
+                    follow(v)
+
+    follow(model)
+    return objects
+
+
+class ModelIndex:
+    """Index of the objects of a model by their name and by their class
+
+    The model is walked once with :func:`get_contained_objects`, following
+    its containment links like ``textx.scoping.tools.get_unique_named_object``
+    and ``textx.get_children_of_type``, so that looking up a name or the
+    objects of a class does not walk the whole model again. The objects are
+    grouped by their class during the walk, and the list of the objects of
+    a class name is built from these groups on its first use.
+
+    Unlike the walks of textX, the walk does not compute the derived
+    geometry of the elements (shapes, points and polyhedra) that has not
+    been accessed yet, so the index only holds the objects of the model and
+    the derived geometry computed before it was built. Computing derived
+    geometry drops the index of the model, so that the next
+    :func:`get_model_index` includes it.
+    """
+
+    def __init__(self, model) -> None:
+        self.model = model
+        self._objects = dict()
+        # Position in the model and object, for each concrete class
+        self._classes = dict()
+        self._types = dict()
+        for i, obj in enumerate(get_contained_objects(model)):
+            self._classes.setdefault(type(obj), list()).append((i, obj))
+            if hasattr(obj, "name"):
+                self._objects.setdefault(obj.name, list()).append(obj)
+
+    def __contains__(self, name):
+        return name in self._objects
+
+    def __len__(self):
+        return len(self._objects)
+
+    def get_all(self, name):
+        """Return the objects with a name, in the order of the model"""
+        return list(self._objects.get(name, []))
+
+    def get_children_of_type(self, typ):
+        """Return the objects of a class or class name, in the order of the model
+
+        Like ``textx.get_children_of_type``, the objects are matched on the
+        name of their class, not on the classes they inherit from. Derived
+        geometry that has not been computed is left out (see
+        :class:`ModelIndex`), e.g. the ``Polyhedron`` objects of a model
+        loaded without ``eager_geometry`` until their elements are accessed.
+        """
+        if not isinstance(typ, str):
+            typ = typ.__name__
+        objects = self._types.get(typ)
+        if objects is None:
+            groups = [g for cls, g in self._classes.items() if cls.__name__ == typ]
+            objects = [obj for _, obj in heapq.merge(*groups)]
+            self._types[typ] = objects
+        return list(objects)
+
+    def get_unique(self, name):
+        """Return the only object with a name"""
+        objects = self._objects.get(name, [])
+        if len(objects) != 1:
+            raise TextXSemanticError(
+                "Expected one object named {} in {}, found {}".format(
+                    name, getattr(self.model, "name", "the model"), len(objects)
+                )
+            )
+        return objects[0]
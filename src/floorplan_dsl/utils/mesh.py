@@ -0,0 +1,136 @@
+from functools import lru_cache
+
+import numpy as np
+
+
+def get_newell_normals(polygons):
+    """Return the (k, 3) normals of (k, n, 3) planar polygons with Newell's method
+
+    The vertices of each polygon are counter-clockwise about its normal.
+    """
+    return 0.5 * np.cross(polygons, np.roll(polygons, -1, axis=-2)).sum(axis=-2)
+
+
+def is_convex(polygons, normals, tolerance=1e-12):
+    """Return whether (k, n, 3) planar polygons are convex, given their normals"""
+    edges = np.roll(polygons, -1, axis=-2) - polygons
+    turns = np.cross(edges, np.roll(edges, -1, axis=-2))
+    return np.all(np.einsum("kni,ki->kn", turns, normals) >= -tolerance, axis=-1)
+
+
+@lru_cache(maxsize=None)
+def get_fan_triangles(n):
+    """Return the (n - 2, 3) triangles of a convex polygon with ``n`` vertices"""
+    i = np.arange(1, n - 1)
+    triangles = np.column_stack((np.zeros(n - 2, dtype=int), i, i + 1))
+    triangles.flags.writeable = False
+    return triangles
+
+
+def get_ear_triangles(polygon, normal):
+    """Return the (n - 2, 3) triangles of a simple polygon by ear clipping
+
+    The triangles keep the order of the vertices, counter-clockwise about
+    ``normal``.
+    """
+    # Drop the coordinate along which the polygon is the most flat
+    axes = [a for a in range(3) if a != np.argmax(np.abs(normal))]
+    points = polygon[:, axes]
+    sign = np.sign(normal[np.argmax(np.abs(normal))])
+    if axes == [0, 2]:
+        sign = -sign
+
+    def cross(o, a, b):
+        return sign * ((a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0]))
+
+    def contains(a, b, c, p):
+        return cross(a, b, p) >= 0 and cross(b, c, p) >= 0 and cross(c, a, p) >= 0
+
+    remaining = list(range(len(points)))
+    triangles = list()
+    while len(remaining) > 3:
+        for k in range(len(remaining)):
+            i, j, l = (
+                remaining[k - 1],
+                remaining[k],
+                remaining[(k + 1) % len(remaining)],
+            )
+            a, b, c = points[i], points[j], points[l]
+            if cross(a, b, c) <= 0:
+                continue
+            others = (points[m] for m in remaining if m not in (i, j, l))
+            if any(contains(a, b, c, p) for p in others):
+                continue
+            triangles.append((i, j, l))
+            del remaining[k]
+            break
+        else:
+            # Degenerate polygon, fall back to a fan of the remaining vertices
+            triangles.extend(
+                (remaining[0], remaining[m], remaining[m + 1])
+                for m in range(1, len(remaining) - 1)
+            )
+            remaining = remaining[:3]
+            break
+    if len(remaining) == 3:
+        triangles.append(tuple(remaining))
+    return np.array(triangles[: len(points) - 2], dtype=int)
+
+
+@lru_cache(maxsize=None)
+def get_prism_side_triangles(n):
+    """Return the (2n, 3) triangles of the sides of a prism
+
+    The coordinates of the prism are the ``n`` base vertices followed by the
+    ``n`` top vertices (see :func:`get_prism_face_index`).
+    """
+    i = np.arange(n)
+    j = (i + 1) % n
+    triangles = np.concatenate(
+        (np.column_stack((i, j, n + j)), np.column_stack((i, n + j, n + i)))
+    )
+    triangles.flags.writeable = False
+    return triangles
+
+
+def get_prism_triangles(cap, n):
+    """Return the triangles of a prism whose top is extruded along the normal of its base
+
+    Parameters
+    ----------
+    cap: (n - 2, 3) triangles of the base, counter-clockwise about its normal
+    n: number of vertices of the base
+    """
+    return np.concatenate((cap[:, ::-1], cap + n, get_prism_side_triangles(n)))
+
+
+def triangulate_prisms(coordinates):
+    """Return the triangles of prisms with bases of ``n`` vertices
+
+    Parameters
+    ----------
+    coordinates: (k, 2n, 3) array of the base vertices followed by the top
+        vertices of each prism
+
+    Returns
+    -------
+    (k, 4n - 4, 3) array of the vertex indices of the triangles of each
+    prism, oriented with their normal pointing outwards
+    """
+    k, n = coordinates.shape[0], coordinates.shape[1] // 2
+    bases = coordinates[:, :n]
+    normals = get_newell_normals(bases)
+
+    triangles = np.empty((k, 4 * n - 4, 3), dtype=int)
+    convex = is_convex(bases, normals)
+    if convex.any():
+        triangles[convex] = get_prism_triangles(get_fan_triangles(n), n)
+    for i in np.flatnonzero(~convex):
+        cap = get_ear_triangles(bases[i], normals[i])
+        triangles[i] = get_prism_triangles(cap, n)
+
+    # Prisms extruded against the normal of their base are turned inside out
+    extrusion = coordinates[:, n:].mean(axis=1) - bases.mean(axis=1)
+    flip = np.einsum("ki,ki->k", extrusion, normals) < 0
+    triangles[flip] = triangles[flip][..., ::-1]
+    return triangles
@@ -0,0 +1,25 @@
+from textx.exceptions import TextXSemanticError
+
+# Values of the boolean model parameters given as strings, e.g. by the textX CLI
+TRUE_VALUES = ("true", "yes", "on", "1")
+FALSE_VALUES = ("false", "no", "off", "0")
+
+
+def get_bool_param(params, name, default=False):
+    """Return the value of a boolean parameter of a mapping of model parameters
+
+    The textX CLI passes the values of the parameters as strings, which are
+    converted with ``TRUE_VALUES`` and ``FALSE_VALUES``. Any other value is
+    rejected.
+    """
+    value = params.get(name, default)
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        if value.strip().lower() in TRUE_VALUES:
+            return True
+        if value.strip().lower() in FALSE_VALUES:
+            return False
+    raise TextXSemanticError(
+        "The model parameter {} must be true or false, not {!r}".format(name, value)
+    )
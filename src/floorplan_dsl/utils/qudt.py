@@ -1,5 +1,7 @@
 import numpy as np
 
+from floorplan_dsl.utils.index import get_model_index
+
 
 def convert_angle_units(model, unit):
 
@@ -10,3 +12,24 @@ def convert_angle_units(model, unit):
         elif unit == "rad" and model.unit == "deg":
             model.unit = "rad"
             model.value = np.deg2rad(model.value)
+
+
+def convert_angle_value(value, from_unit, to_unit):
+    if from_unit == "deg" and to_unit == "rad":
+        return np.deg2rad(value)
+    elif from_unit == "rad" and to_unit == "deg":
+        return np.rad2deg(value)
+    return value
+
+
+def convert_model_angle_units(model, unit):
+    """Convert the angles and angle variables of a model to a unit
+
+    The angles are found with the index of the model instead of walking the
+    model for each class.
+    """
+    index = get_model_index(model)
+    for a in index.get_children_of_type("Angle"):
+        convert_angle_units(a, unit)
+    for a in index.get_children_of_type("AngleVariable"):
+        convert_angle_units(a, unit)
@@ -0,0 +1,122 @@
+import numpy as np
+
+
+def get_circle_points(radius, center=(0.0, 0.0), n=32):
+    """Return the (n, 2) vertices of a regular polygon approximating a circle"""
+    angles = np.linspace(0.0, 2 * np.pi, n, endpoint=False)
+    return np.column_stack(
+        (center[0] + radius * np.cos(angles), center[1] + radius * np.sin(angles))
+    )
+
+
+def get_bounds(polygons):
+    """Return the (n, 4) array with the min x, min y, max x and max y of each polygon"""
+    if not polygons:
+        return np.empty((0, 4))
+    return np.array([np.concatenate((p.min(axis=0), p.max(axis=0))) for p in polygons])
+
+
+def rasterize_polygon(points, origin, resolution, shape):
+    """Return the cells of a grid whose center lies inside a polygon
+
+    The cells are found row by row with the even-odd rule: the crossings of
+    the center line of all the rows with all the edges of the polygon are
+    computed at once, and the spans between pairs of crossings are filled
+    with a cumulative sum.
+
+    Parameters
+    ----------
+    points: (n, 2) array of the vertices of the polygon
+    origin: (x, y) coordinates of the lower left corner of the grid
+    resolution: size of the cells
+    shape: (rows, cols) of the grid, row 0 being the lowest one
+
+    Returns
+    -------
+    (rows, cols) boolean array
+    """
+    rows, cols = shape
+    mask = np.zeros(shape, dtype=bool)
+    points = np.asarray(points, dtype=float)
+    if rows == 0 or cols == 0 or len(points) < 3:
+        return mask
+
+    # Only the rows within the bounds of the polygon
+    ymin, ymax = points[:, 1].min(), points[:, 1].max()
+    r0 = max(int(np.ceil((ymin - origin[1]) / resolution - 0.5)), 0)
+    r1 = min(int(np.ceil((ymax - origin[1]) / resolution - 0.5)), rows)
+    if r0 >= r1:
+        return mask
+    y = origin[1] + (np.arange(r0, r1) + 0.5) * resolution
+
+    x1, y1 = points[:, 0], points[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+
+    # Edges crossing the center line of each row, with half-open intervals
+    # so that a vertex on a center line is counted once
+    yy = y[:, None]
+    crossing = (y1 <= yy) != (y2 <= yy)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = x1 + (yy - y1) * (x2 - x1) / (y2 - y1)
+    x = np.where(crossing, x, np.inf)
+    x.sort(axis=1)
+
+    # Pairs of crossings delimit the spans inside the polygon
+    n = crossing.sum(axis=1).max()
+    starts = x[:, 0:n:2]
+    ends = x[:, 1:n:2]
+    valid = np.isfinite(ends)
+    c0 = np.clip(np.ceil((starts - origin[0]) / resolution - 0.5), 0, cols)
+    c1 = np.clip(np.ceil((ends - origin[0]) / resolution - 0.5), 0, cols)
+
+    row_idx = np.broadcast_to(np.arange(r1 - r0)[:, None], c0.shape)[valid]
+    diff = np.zeros((r1 - r0, cols + 1), dtype=np.int32)
+    np.add.at(diff, (row_idx, c0[valid].astype(int)), 1)
+    np.add.at(diff, (row_idx, c1[valid].astype(int)), -1)
+    mask[r0:r1] = np.cumsum(diff[:, :cols], axis=1) > 0
+    return mask
+
+
+def get_squared_segment_distances(points, segments):
+    """Return the squared distances of points to line segments
+
+    Parameters
+    ----------
+    points: (n, 2) array of points
+    segments: (m, 4) array of the start (x, y) and end (x, y) of the segments
+
+    Returns
+    -------
+    (n, m) array of the squared distance of each point to each segment
+    """
+    ax, ay, bx, by = segments.T
+    abx, aby = bx - ax, by - ay
+    length = abx * abx + aby * aby
+    # Degenerate segments are measured from their start
+    length[length == 0] = np.inf
+
+    apx = points[:, 0, None] - ax
+    apy = points[:, 1, None] - ay
+    t = np.clip((apx * abx + apy * aby) / length, 0.0, 1.0)
+    dx = apx - t * abx
+    dy = apy - t * aby
+    return dx * dx + dy * dy
+
+
+def get_segment_distances(points, segments):
+    """Return the (n, m) distances of (n, 2) points to (m, 4) line segments"""
+    return np.sqrt(get_squared_segment_distances(points, segments))
+
+
+def get_min_segment_distances(points, segments, block=2**20):
+    """Return the distance of each point to the closest of the segments
+
+    The distances are computed for blocks of segments, so that at most
+    ``block`` point-segment pairs are held in memory at once.
+    """
+    squared = np.full(len(points), np.inf)
+    step = max(block // max(len(points), 1), 1)
+    for i in range(0, len(segments), step):
+        d = get_squared_segment_distances(points, segments[i : i + step])
+        np.minimum(squared, d.min(axis=1), out=squared)
+    return np.sqrt(squared)
@@ -0,0 +1,177 @@
+from operator import attrgetter
+
+import numpy as np
+import numpy.random as random
+
+from floorplan_dsl.utils.index import get_model_index
+from floorplan_dsl.utils.qudt import convert_angle_value
+
+
+class SampleBinding:
+    """A slot of the floor plan model that receives the samples of one distribution
+
+    Parameters
+    ----------
+    target: object whose ``value`` attribute is overwritten by each sample
+    distribution: distribution of the variation model to sample from
+    label: human-readable name of the slot, e.g. ``hallway.location.translation.x``
+    element: floor plan element (space, feature, opening) owning the slot, or None for variables
+    """
+
+    def __init__(self, target, distribution, label, element=None) -> None:
+        self.target = target
+        self.distribution = distribution
+        self.label = label
+        self.element = element
+
+    def set(self, value):
+        # Samples are given in the unit declared in the floor plan model,
+        # which the object processors may have converted (e.g. deg to rad)
+        declared_unit = getattr(self.target, "declared_unit", None)
+        if declared_unit is not None:
+            value = convert_angle_value(value, declared_unit, self.target.unit)
+        self.target.value = value
+
+
+class SamplingPlan:
+    """Flat table of the slots written by each sample of a variation model
+
+    The references and FQNs of the variation model are resolved once against
+    the floor plan model, so that drawing a sample only writes values into
+    the pre-resolved slots. The bindings are kept in the order of the
+    variation model, i.e. the order in which the distributions are sampled.
+    """
+
+    def __init__(self, bindings) -> None:
+        self.bindings = bindings
+
+    @classmethod
+    def compile(cls, fp_model, var_model):
+        bindings = list()
+        index = get_model_index(fp_model)
+        for var in var_model.variations:
+            fp_obj = index.get_unique(var.ref.name)
+
+            # If it's a variable, its value is sampled directly
+            if var.__class__.__name__ == "VariableRef":
+                bindings.append(SampleBinding(fp_obj, var.distribution, var.ref.name))
+                continue
+
+            # Otherwise resolve the FQN of each attribute
+            for att in var.attributes:
+                var_obj = attrgetter(att.fqn)(fp_obj)
+                if var_obj.__class__.__name__ in ["LengthValue", "AngleValue"]:
+                    target = var_obj.value
+                elif var_obj.__class__.__name__ in ["Length", "Angle"]:
+                    target = var_obj
+                else:
+                    continue
+                label = "{}.{}".format(var.ref.name, att.fqn)
+                bindings.append(SampleBinding(target, att.distribution, label, fp_obj))
+
+        return cls(bindings)
+
+    def __len__(self):
+        return len(self.bindings)
+
+    @property
+    def labels(self):
+        return [b.label for b in self.bindings]
+
+    def sample(self, rng=random):
+        """Draw a value for each slot from the random stream ``rng`` and write it into the model"""
+        for b in self.bindings:
+            b.set(b.distribution.sample(rng))
+
+    def sample_matrix(self, n, rng=random):
+        """Draw ``n`` samples of every slot with one vectorized call per distribution
+
+        Returns
+        -------
+        numpy array of shape ``(n, len(self))`` where row ``i`` holds the values of sample ``i``
+        """
+        matrix = np.empty((n, len(self.bindings)))
+        for j, b in enumerate(self.bindings):
+            matrix[:, j] = b.distribution.sample_n(n, rng)
+        return matrix
+
+    @property
+    def values(self):
+        """The current values of the slots, in the units declared in the floor plan model"""
+        values = list()
+        for b in self.bindings:
+            value = b.target.value
+            declared_unit = getattr(b.target, "declared_unit", None)
+            if declared_unit is not None:
+                value = convert_angle_value(value, b.target.unit, declared_unit)
+            values.append(value)
+        return values
+
+    def apply(self, row):
+        """Write a row of a parameter matrix into the model"""
+        for b, value in zip(self.bindings, np.asarray(row).tolist()):
+            b.set(value)
+
+    def save_matrix(self, path, matrix, seeds):
+        """Save a parameter matrix as CSV, one row per seed and one column per slot"""
+        data = np.column_stack((np.asarray(seeds), matrix))
+        header = ",".join(["seed"] + self.labels)
+        np.savetxt(path, data, delimiter=",", header=header, comments="", fmt="%.10g")
+
+
+class AcceptanceStats:
+    """Accepted and rejected samples of a variation model
+
+    Besides the overall counts, each binding counts the rejected samples in
+    which its floor plan element was involved, e.g. one of two overlapping
+    spaces. The bindings of variables are not attributed to any element.
+    """
+
+    def __init__(self, plan) -> None:
+        self.labels = plan.labels
+        self.elements = [b.element for b in plan.bindings]
+        self.samples = 0
+        self.accepted = 0
+        self.rejections = [0] * len(self.labels)
+
+    def add(self, rejected_elements=None):
+        """Count a sample, rejected because of ``rejected_elements`` unless it is None"""
+        self.samples += 1
+        if rejected_elements is None:
+            self.accepted += 1
+            return
+
+        for i, element in enumerate(self.elements):
+            if element is not None and element in rejected_elements:
+                self.rejections[i] += 1
+
+    @property
+    def acceptance_rate(self):
+        if self.samples == 0:
+            return 0.0
+        return self.accepted / self.samples
+
+    def get_acceptance_rates(self):
+        """Return the acceptance rate of each binding, or None for the bindings of variables"""
+        rates = dict()
+        for label, element, rejections in zip(
+            self.labels, self.elements, self.rejections
+        ):
+            if element is None or self.samples == 0:
+                rates[label] = None
+            else:
+                rates[label] = 1.0 - rejections / self.samples
+        return rates
+
+    def report(self, file=None):
+        """Print the overall acceptance rate and the one of each binding"""
+        print(
+            "Accepted {} of {} samples ({:.1%})".format(
+                self.accepted, self.samples, self.acceptance_rate
+            ),
+            file=file,
+        )
+        width = max([len(label) for label in self.labels] + [9])
+        for label, rate in self.get_acceptance_rates().items():
+            rate = "n/a" if rate is None else "{:.1%}".format(rate)
+            print("  {:<{w}}  {:>6}".format(label, rate, w=width), file=file)
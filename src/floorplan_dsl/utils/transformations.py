@@ -2,8 +2,16 @@ import numpy as np
 
 
 class Transformation:
-    @staticmethod
-    def get_rotation_matrix(gamma=0.0, beta=0.0, alpha=0.0):
+    """
+    Rigid transformations as 4x4 matrices
+
+    The ``get_..._matrices`` methods take arrays of poses and return stacks
+    of shape (N, 3, 3) or (N, 4, 4), while the single matrix methods return
+    the first matrix of a stack of one.
+    """
+
+    @classmethod
+    def get_rotation_matrix(cls, gamma=0.0, beta=0.0, alpha=0.0):
         """
         Sets the orientation by calculating the rotation matrix
 
@@ -17,32 +25,57 @@ class Transformation:
             Angle in radians for the rotation with respect to the Z axis
 
         """
+        return cls.get_rotation_matrices(gamma, beta, alpha)[0]
 
-        rx = np.array(
-            [
-                [1, 0, 0],
-                [0, np.cos(gamma), -np.sin(gamma)],
-                [0, np.sin(gamma), np.cos(gamma)],
-            ]
-        )
+    @classmethod
+    def get_rotation_matrices(cls, gamma=0.0, beta=0.0, alpha=0.0):
+        """
+        Returns the (N, 3, 3) stack of the rotations Rz(alpha) Ry(beta) Rx(gamma)
 
-        ry = np.array(
-            [
-                [np.cos(beta), 0, np.sin(beta)],
-                [0, 1, 0],
-                [-np.sin(beta), 0, np.cos(beta)],
-            ]
-        )
+        The matrices are computed in closed form. If none of the angles has a
+        rotation wrt the X or Y axis, the planar rotations are used instead.
 
-        rz = np.array(
-            [
-                [np.cos(alpha), -np.sin(alpha), 0],
-                [np.sin(alpha), np.cos(alpha), 0],
-                [0, 0, 1],
-            ]
+        Parameters
+        ----------
+        gamma: float or (N,) array of the angles wrt the X axis
+        beta: float or (N,) array of the angles wrt the Y axis
+        alpha: float or (N,) array of the angles wrt the Z axis
+        """
+        gamma, beta, alpha = np.broadcast_arrays(
+            *[np.atleast_1d(np.asarray(a, dtype=float)) for a in (gamma, beta, alpha)]
         )
+        if not gamma.any() and not beta.any():
+            return cls.get_planar_rotation_matrices(alpha)
+
+        cg, sg = np.cos(gamma), np.sin(gamma)
+        cb, sb = np.cos(beta), np.sin(beta)
+        ca, sa = np.cos(alpha), np.sin(alpha)
+
+        r = np.empty(alpha.shape + (3, 3))
+        r[..., 0, 0] = ca * cb
+        r[..., 0, 1] = ca * sb * sg - sa * cg
+        r[..., 0, 2] = ca * sb * cg + sa * sg
+        r[..., 1, 0] = sa * cb
+        r[..., 1, 1] = sa * sb * sg + ca * cg
+        r[..., 1, 2] = sa * sb * cg - ca * sg
+        r[..., 2, 0] = -sb
+        r[..., 2, 1] = cb * sg
+        r[..., 2, 2] = cb * cg
+        return r
+
+    @staticmethod
+    def get_planar_rotation_matrices(alpha):
+        """Returns the (N, 3, 3) stack of the rotations wrt the Z axis by the angles ``alpha``"""
+        alpha = np.atleast_1d(np.asarray(alpha, dtype=float))
+        ca, sa = np.cos(alpha), np.sin(alpha)
 
-        return rz.dot(ry.dot(rx))
+        r = np.zeros(alpha.shape + (3, 3))
+        r[..., 0, 0] = ca
+        r[..., 0, 1] = -sa
+        r[..., 1, 0] = sa
+        r[..., 1, 1] = ca
+        r[..., 2, 2] = 1.0
+        return r
 
     @classmethod
     def get_rotation_matrix_from_model(cls, model):
@@ -61,7 +94,14 @@ class Transformation:
 
     @classmethod
     def get_translation_vector_from_model(cls, model):
-        return cls.get_translation_vector(model.x.value, model.y.value, model.z.value)
+        x, y, z = (0, 0, 0)
+        if model.x:
+            x = model.x.value
+        if model.y:
+            y = model.y.value
+        if model.z:
+            z = model.z.value
+        return cls.get_translation_vector(x, y, z)
 
     @classmethod
     def get_transformation_matrix(cls, t=None, r=None):
@@ -78,33 +118,127 @@ class Transformation:
         T : numpy array
             The 4x4 transformation matrix
         """
+        return cls.get_transformation_matrices(t, r)[0]
+
+    @staticmethod
+    def get_transformation_matrices(t=None, r=None):
+        """
+        Returns the (N, 4, 4) stack of transformation matrices
+
+        Parameters
+        ----------
+        t: (N, 3) array of translations, or None for no translation
+        r: (N, 3, 3) stack of rotation matrices, or None for no rotation
+        """
+        n = 1
+        if t is not None:
+            t = np.asarray(t, dtype=float).reshape(-1, 3)
+            n = len(t)
+        if r is not None:
+            r = np.asarray(r, dtype=float).reshape(-1, 3, 3)
+            n = max(n, len(r))
+
+        tm = np.zeros((n, 4, 4))
         if r is None:
-            r = cls.get_rotation_matrix()
-        rotation = np.vstack((r, np.zeros(3)))
+            tm[:, 0, 0] = tm[:, 1, 1] = tm[:, 2, 2] = 1.0
+        else:
+            tm[:, :3, :3] = r
+        if t is not None:
+            tm[:, :3, 3] = t
+        tm[:, 3, 3] = 1.0
+        return tm
 
-        if t is None:
-            t = cls.get_translation_vector()
-        translation = np.vstack((t.reshape(3, 1), np.array([1])))
+    @staticmethod
+    def get_planar_transformation_matrices(x, y, alpha):
+        """
+        Returns the (N, 4, 4) stack of the planar (SE(2)) transformation matrices
+
+        Each matrix is a rotation wrt the Z axis by ``alpha`` and a translation
+        by ``x`` and ``y``, built directly from the cosine and sine of the angle.
+        """
+        x, y, alpha = np.broadcast_arrays(
+            *[np.atleast_1d(np.asarray(a, dtype=float)) for a in (x, y, alpha)]
+        )
+        ca, sa = np.cos(alpha), np.sin(alpha)
 
-        return np.hstack((rotation, translation))
+        tm = np.zeros(alpha.shape + (4, 4))
+        tm[..., 0, 0] = ca
+        tm[..., 0, 1] = -sa
+        tm[..., 1, 0] = sa
+        tm[..., 1, 1] = ca
+        tm[..., 2, 2] = 1.0
+        tm[..., 0, 3] = x
+        tm[..., 1, 3] = y
+        tm[..., 3, 3] = 1.0
+        return tm
 
     @classmethod
     def get_transformation_matrix_from_model(cls, model):
-        if model.translation is None:
-            t = cls.get_translation_vector()
-        else:
-            t = cls.get_translation_vector_from_model(model.translation)
+        return cls.get_transformation_matrices_from_models([model])[0]
 
-        if model.rotation is None:
-            r = cls.get_rotation_matrix()
-        else:
-            r = cls.get_rotation_matrix_from_model(model.rotation)
-        return cls.get_transformation_matrix(t, r)
+    @classmethod
+    def get_transformation_matrices_from_models(cls, models):
+        """Returns the (N, 4, 4) stack of the transformation matrices of N pose coordinates"""
+        values = np.zeros((len(models), 6))
+        for i, model in enumerate(models):
+            for j, v in enumerate((model.translation, model.rotation)):
+                if v is None:
+                    continue
+                if v.x:
+                    values[i, 3 * j] = v.x.value
+                if v.y:
+                    values[i, 3 * j + 1] = v.y.value
+                if v.z:
+                    values[i, 3 * j + 2] = v.z.value
+
+        r = cls.get_rotation_matrices(values[:, 3], values[:, 4], values[:, 5])
+        return cls.get_transformation_matrices(values[:, :3], r)
+
+    @staticmethod
+    def get_inverse(tm):
+        """
+        Returns the inverse of a 4x4 rigid transformation matrix, or of a stack of them
+
+        The inverse of a rotation R and translation t is the rotation R^T and
+        the translation -R^T t, so no general matrix inversion is needed.
+        """
+        r = np.swapaxes(tm[..., :3, :3], -1, -2)
+        inverse = np.zeros(np.shape(tm))
+        inverse[..., :3, :3] = r
+        inverse[..., :3, 3] = -np.einsum("...ij,...j->...i", r, tm[..., :3, 3])
+        inverse[..., 3, 3] = 1.0
+        return inverse
+
+    @staticmethod
+    def compose(*tms):
+        """Returns the product of 4x4 transformation matrices, or of stacks of them, from left to right"""
+        result = tms[0]
+        for tm in tms[1:]:
+            result = np.matmul(result, tm)
+        return result
 
     @staticmethod
-    def transform(of, wrt):
+    def transform_points(tm, points):
+        """
+        Applies transformation matrices to 3D points in one ``einsum``
+
+        Parameters
+        ----------
+        tm: 4x4 matrix, or (N, 4, 4) stack of matrices
+        points: (M, 3) array of points, or (N, M, 3) array with the points of each matrix
+
+        Returns
+        -------
+        The array of the transformed points, with the shape of ``points``
+        """
+        points = np.asarray(points, dtype=float)
+        homogeneous = np.concatenate((points, np.ones(points.shape[:-1] + (1,))), -1)
+        return np.einsum("...ij,...kj->...ki", tm, homogeneous)[..., :3]
+
+    @classmethod
+    def transform(cls, of, wrt):
         """Return the transformation matrix resulting from the dot product of two 4x4 transformation matrices"""
-        return of.dot(np.linalg.inv(wrt))
+        return cls.compose(of, cls.get_inverse(wrt))
 
     # @staticmethod
     # def _get_spaced_matrix(y):
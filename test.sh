@@ -20,3 +20,6 @@ textx generate models/kitchen.variation --target fpm-v2 --variations 1 -o gen/va
 
 # Generate json-ld models
 textx generate models/*.fpm --target json-ld -o gen/json-ld/v2 --overwrite
+
+# Generate all the example models in one batch
+floorplan-batch models/batch.yaml